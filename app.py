@@ -11,11 +11,19 @@ sys.path.append(str(current_dir))
 env_path = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
-from src.summary import render_txt_summary_ui
-from src.mermaid import render_flowchart_ui
-from src.localization import render_localization_ui
-from src.quiz import render_quiz_ui
-from src.creds import render_credits_ui
+from src.import_profile import timed_import, import_report
+from src.session import get_session_processor, get_session_store
+
+# tab name -> (module, render function). a tab's module and everything it pulls in (langchain, yt_dlp,
+# deepgram, unstructured, chroma) is only imported the first time somebody opens that tab.
+TABS = {
+    "Localizer": ("src.localization", "render_localization_ui"),
+    "Interactive Quiz": ("src.quiz", "render_quiz_ui"),
+    "PDF Analysis": (None, "pdf_processing_tab"),
+    "Youtube Summary": ("src.summary", "render_txt_summary_ui"),
+    "Flowchart": ("src.mermaid", "render_flowchart_ui"),
+    "Credits": ("src.creds", "render_credits_ui"),
+}
 
 
 # Disable Streamlit's file watcher to avoid torch.classes inspection
@@ -35,32 +43,44 @@ def pdf_processing_tab():
             )
     process_docs = st.button("Process Document", type="primary")
 
-    # process the uploaded documents.
+    # hand the uploaded documents to the background ingest workers, the page stays usable meanwhile.
     if process_docs and uploaded_files:
-        with st.spinner("Processing the uploaded documents to extract all relavent data..."):
-            try:
-                all_elements = []
-                for uploaded_file in uploaded_files:
-                    st.info(f"Processing: {uploaded_file.name}")
-                    # save uploaded file temporarily
-                    safe_name = Path(uploaded_file.name).name
-                    temp_path = f"temp_{safe_name}"
-                    with open(temp_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    
-                    # process pdf
-                    from src.pdf_processor import PDF_processor
-                    from src.vectors import add_documents
-                    elements = st.session_state.pdf_processor.process_pdf(temp_path)
-                    all_elements.extend(elements)
-                    # clean up temp file
-                    os.remove(temp_path)
-                
-                add_documents(st.session_state.vector_store, all_elements)
-                st.session_state.documents_processed = True
-                st.success(f"Sucessfully analyzed {len(uploaded_files)} documents with {len(all_elements)} elements")
-            except Exception as e:
-                st.error(f"Error processing documents: {str(e)}")
+        try:
+            from src.ingest_jobs import get_ingest_queue
+            from src.session import get_session_upload_dir
+            
+            upload_dir = get_session_upload_dir()
+            
+            queue = get_ingest_queue()
+            st.session_state.setdefault("ingest_jobs", [])
+            running = set()
+            for job in queue.snapshots(st.session_state.ingest_jobs):
+                if job["state"] not in ("done", "error"):
+                    running.update(job["pdf_paths"])
+            
+            names = []
+            temp_paths = []
+            for uploaded_file in uploaded_files:
+                # save uploaded file temporarily, the worker deletes it when done
+                safe_name = Path(uploaded_file.name).name
+                temp_path = os.path.join(upload_dir, f"temp_{safe_name}")
+                if temp_path in running or temp_path in temp_paths:
+                    st.warning(f"{safe_name} is still being processed")
+                    continue
+                with open(temp_path, "wb") as f:
+                    f.write(uploaded_file.getbuffer())
+                names.append(safe_name)
+                temp_paths.append(temp_path)
+            
+            # several files go in one job, their layout passes run in parallel processes and are embedded together
+            if temp_paths:
+                job_name = names[0] if len(names) == 1 else f"{len(names)} documents"
+                job_id = queue.submit(job_name, temp_paths, get_session_store(), get_session_processor())
+                st.session_state.ingest_jobs.append(job_id)
+        except Exception as e:
+            st.error(f"Error processing documents: {str(e)}")
+    
+    render_ingest_progress()
     
     # chat interface.
     st.markdown("---")
@@ -85,13 +105,16 @@ def pdf_processing_tab():
         
         # st.chat_mssg is used for creating chating bubbles.
         with st.chat_message("assistant"):
-            with st.spinner("Analyzing..."):
-                try:
-                    from src.vectors import query
-                    from src.chat import get_respo
+            try:
+                from src.vectors import query, embed_query
+                from src.chat import stream_respo
+                
+                with st.spinner("Analyzing..."):
+                    # embed the question once, it is used for retrieval and for the answer cache
+                    query_embedding = embed_query(get_session_store(), prompt)
                     
                     # Query the vector store directly
-                    results = query(st.session_state.vector_store, prompt)
+                    results = query(get_session_store(), prompt, query_embedding=query_embedding)
                 
                     # Process results into expected format
                     processed_results = []
@@ -100,19 +123,61 @@ def pdf_processing_tab():
                             "content": doc.page_content,
                             "metadata": doc.metadata
                         })
-                    
-                    response = get_respo(
-                        prompt,
-                        processed_results,
-                        st.session_state.messages[:-1]
-                    )
-                    st.markdown(response)
-                    st.session_state.messages.append({"role": "assistant", "content": response})
-                    
-                except Exception as e:
-                    error_msg = f"Sorry sir but there is an error generating response: {str(e)}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                
+                # the answer is rendered as it is generated instead of after the whole generation
+                response = st.write_stream(stream_respo(
+                    prompt,
+                    processed_results,
+                    st.session_state.messages[:-1],
+                    store=get_session_store(),
+                    query_embedding=query_embedding
+                ))
+                st.session_state.messages.append({"role": "assistant", "content": response})
+                
+            except Exception as e:
+                error_msg = f"Sorry sir but there is an error generating response: {str(e)}"
+                st.error(error_msg)
+                st.session_state.messages.append({"role": "assistant", "content": error_msg})
+
+def render_ingest_progress():
+    """progress of this session's ingest jobs, polled every second while any of them is still running"""
+    job_ids = st.session_state.get("ingest_jobs", [])
+    if not job_ids:
+        return
+    from src.ingest_jobs import get_ingest_queue
+    queue = get_ingest_queue()
+    any_active = any(job["state"] not in ("done", "error") for job in queue.snapshots(job_ids))
+    
+    @st.fragment(run_every=1.0 if any_active else None)
+    def ingest_progress():
+        jobs = queue.snapshots(st.session_state.get("ingest_jobs", []))
+        for job in jobs:
+            for warning in job["warnings"]:
+                st.warning(warning)
+            if job["state"] == "error":
+                st.error(f"{job['name']}: {job['error']}")
+            elif job["state"] == "done":
+                st.success(f"{job['name']}: analyzed {job['elements']} elements, {job['chunks_total']} new chunks embedded in {job['seconds']:.0f}s")
+            else:
+                done, total = {
+                    "queued": (0, 1),
+                    "parsing": (0, 1),
+                    "describing": (job["images_done"], job["images_total"]),
+                    "embedding": (job["chunks_done"], job["chunks_total"]),
+                }[job["state"]]
+                st.progress(
+                    done / total if total else 0.0,
+                    text=f"{job['name']}: {job['state']} | files {job['files_done']}/{job['files']} | pages {job['pages']} | "
+                         f"images {job['images_done']}/{job['images_total']} | chunks {job['chunks_done']}/{job['chunks_total']}"
+                )
+        
+        if any(job["state"] == "done" for job in jobs) and not st.session_state.documents_processed:
+            st.session_state.documents_processed = True
+        if any_active and not any(job["state"] not in ("done", "error") for job in jobs):
+            # everything finished, rerun the whole page so the chat shows up and polling stops
+            st.rerun(scope="app")
+    
+    ingest_progress()
 
 def main():
     st.set_page_config(
@@ -158,13 +223,7 @@ def main():
         from src.config import Config
         st.session_state.config = Config()
     
-    if "pdf_processor" not in st.session_state:
-        from src.pdf_processor import PDF_processor
-        st.session_state.pdf_processor = PDF_processor()
-    
-    if "vector_store" not in st.session_state:
-        from src.vectors import setup_vs
-        st.session_state.vector_store = setup_vs(api_key)
+    # the pdf processor and the vector store are created by the tabs that need them, see src/session.py
     
     if "messages" not in st.session_state:
         st.session_state.messages = []
@@ -175,26 +234,61 @@ def main():
     # Main title
     st.title("Fluxora: Your Learning Wingman")
     
-    # Create tabs
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Localizer","Interactive Quiz","PDF Analysis", "Youtube Summary", "Flowchart", "Credits"])
-    
-    with tab1:
-         render_localization_ui()
+    # only the selected tab runs, st.tabs would run (and import) every tab on every rerun
+    selected_tab = st.radio(
+        "Section",
+        list(TABS),
+        horizontal=True,
+        label_visibility="collapsed",
+        key="selected_tab"
+    )
+    render_tab(selected_tab)
     
-    with tab2:
-        render_quiz_ui()
+    render_scheduler_metrics()
+    render_import_profile()
 
-    with tab3:
-        pdf_processing_tab()
-
-    with tab4:
-        render_txt_summary_ui("./texts")
+def render_tab(tab_name):
+    """import the tab's module on first use and render it"""
+    module_name, function_name = TABS[tab_name]
+    if module_name is None:
+        render = globals()[function_name]
+    else:
+        render = getattr(timed_import(module_name), function_name)
+    
+    if function_name == "render_txt_summary_ui":
+        render("./texts")
+    else:
+        render()
 
-    with tab5:
-        render_flowchart_ui()
+def render_import_profile():
+    """how long the first import of every tab module took, it is what a cold start of that tab costs"""
+    report = import_report()
+    if not report:
+        return
+    with st.sidebar.expander("Import Profile"):
+        for row in report:
+            st.markdown(f"**{row['module']}**: {row['seconds']:.2f}s, {row['modules_loaded']} modules")
+            st.caption(", ".join(row['packages'][:12]) + (" ..." if len(row['packages']) > 12 else ""))
 
-    with tab6:
-        render_credits_ui()
+def render_scheduler_metrics():
+    """queue depth and waiting times of the per model request scheduler"""
+    from src.ratelimit import scheduler_stats
+    
+    stats = scheduler_stats()
+    if not stats:
+        return
+    with st.sidebar.expander("API Scheduler"):
+        for model, model_stats in stats.items():
+            st.markdown(f"**{model}** ({model_stats['rate_per_minute']}/min)")
+            col1, col2 = st.columns(2)
+            col1.metric("Queued", model_stats['queue_depth'])
+            col2.metric("Peak Queue", model_stats['max_queue_depth'])
+            st.caption(
+                f"Interactive: {model_stats['granted']['interactive']} sent, "
+                f"avg wait {model_stats['avg_wait_seconds']['interactive']}s | "
+                f"Background: {model_stats['granted']['background']} sent, "
+                f"avg wait {model_stats['avg_wait_seconds']['background']}s"
+            )
 
 if __name__ == "__main__":
     main()
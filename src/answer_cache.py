@@ -0,0 +1,108 @@
+# src/answer_cache.py
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .config import Config
+
+
+class AnswerCache:
+    """
+    In memory cache of chat answers, one bucket per chroma collection.
+    a cached answer is reused when a new question is close enough to the cached one (cosine similarity
+    of the query embeddings), retrieved the exact same chunks, follows the same recent conversation
+    (`history_key`), and the collection hasn't changed since.
+    """
+
+    def __init__(self, threshold: float, ttl_seconds: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: Dict[str, List[dict]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def lookup(self, scope: str, query_embedding: List[float], chunk_ids: List[str], corpus_version: int,
+               history_key: str = "") -> Optional[str]:
+        query = self._unit(query_embedding)
+        chunk_key = tuple(sorted(chunk_ids))
+        now = time.time()
+        with self.lock:
+            # drop whatever expired while we are here.
+            entries = [e for e in self.entries.get(scope, []) if now - e["created"] < self.ttl_seconds]
+            if entries:
+                self.entries[scope] = entries
+            else:
+                self.entries.pop(scope, None)
+
+            candidates = [
+                e for e in entries
+                if e["version"] == corpus_version and e["chunks"] == chunk_key and e["history"] == history_key
+            ]
+            if candidates:
+                similarities = np.stack([e["embedding"] for e in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    return candidates[best]["answer"]
+            self.misses += 1
+            return None
+
+    def put(self, scope: str, query_embedding: List[float], chunk_ids: List[str], corpus_version: int, answer: str,
+            history_key: str = ""):
+        if not answer or not answer.strip():
+            # an empty stream would be replayed as an empty answer until it expires
+            return
+        with self.lock:
+            entries = self.entries.setdefault(scope, [])
+            entries.append({
+                "embedding": self._unit(query_embedding),
+                "chunks": tuple(sorted(chunk_ids)),
+                "version": corpus_version,
+                "history": history_key,
+                "answer": answer,
+                "created": time.time(),
+            })
+            # oldest answers go first once we are over the limit.
+            if len(entries) > self.max_entries:
+                del entries[:len(entries) - self.max_entries]
+
+    def invalidate(self, scope: str):
+        """forget every answer for this collection, called whenever its documents change"""
+        with self.lock:
+            self.entries.pop(scope, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": sum(len(entries) for entries in self.entries.values()),
+            }
+
+
+_answer_cache = None  # lazy singleton
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Get the process wide answer cache, creating it lazily on first use"""
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            cfg = Config()
+            _answer_cache = AnswerCache(
+                cfg.ANSWER_CACHE_THRESHOLD,
+                cfg.ANSWER_CACHE_TTL_SECONDS,
+                cfg.ANSWER_CACHE_MAX_ENTRIES,
+            )
+    return _answer_cache
@@ -0,0 +1,184 @@
+# src/batch_summary.py
+import asyncio
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import yt_dlp
+
+from .config import Config
+from .ratelimit import request_priority
+from .summary import generate_enhanced_summary, summarize_text
+from .trans import (
+    download_youtube_audio,
+    extract_video_id,
+    resolve_audio_stream,
+    transcribe_audio_chunked,
+    transcribe_youtube_stream,
+)
+from .transcript_store import get_transcript_store
+
+# stages a video goes through, in order. "done" and "error" are final.
+BATCH_STAGES = ["queued", "download", "transcribe", "summarize", "done", "error"]
+
+
+def _playlist_urls(playlist_url: str) -> List[str]:
+    """video urls of a playlist, without resolving every single video"""
+    ydl_opts = {'extract_flat': 'in_playlist', 'quiet': True}
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(playlist_url, download=False)
+    urls = []
+    for entry in info.get('entries') or []:
+        if entry and entry.get('id'):
+            urls.append(f"https://www.youtube.com/watch?v={entry['id']}")
+    return urls
+
+
+def expand_urls(text: str, max_videos: Optional[int] = None) -> List[str]:
+    """
+    Turn the user input (urls separated by new lines, spaces or commas) into a list of video urls.
+    playlists are expanded into their videos, and the same video is only listed once.
+    """
+    max_videos = max_videos or Config().BATCH_MAX_VIDEOS
+    urls = []
+    seen = set()
+    for url in re.split(r"[\s,]+", text.strip()):
+        if not url:
+            continue
+        if ('list=' in url and 'v=' not in url) or '/playlist' in url:
+            try:
+                candidates = _playlist_urls(url)
+            except Exception as e:
+                print(f"Could not read playlist {url}: {str(e)}")
+                continue
+        else:
+            candidates = [url]
+        for candidate in candidates:
+            video_id = extract_video_id(candidate)
+            if video_id and video_id not in seen:
+                seen.add(video_id)
+                urls.append(candidate)
+    return urls[:max_videos]
+
+
+async def run_batch(
+    urls: List[str],
+    analysis_type: str = "Standard Summary",
+    on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+    llm=None,
+) -> List[Dict[str, Any]]:
+    """
+    Summarize many videos as a pipeline.
+    every video walks through download -> transcribe -> summarize, and each stage has its own concurrency limit,
+    so while one video is being summarized the next ones are already transcribing and downloading.
+    `on_update` gets the video's result dict every time it moves to another stage, on the event loop's thread.
+    a failed video ends up as status "error" and doesn't stop the others.
+    """
+    cfg = Config()
+    download_slots = asyncio.Semaphore(cfg.BATCH_DOWNLOAD_CONCURRENCY)
+    transcribe_slots = asyncio.Semaphore(cfg.BATCH_TRANSCRIBE_CONCURRENCY)
+    summarize_slots = asyncio.Semaphore(cfg.BATCH_SUMMARY_CONCURRENCY)
+    store = get_transcript_store()
+
+    results = [
+        {'index': i, 'url': url, 'video_id': extract_video_id(url), 'stage': 'queued', 'timings': {}}
+        for i, url in enumerate(urls)
+    ]
+
+    def move(result, stage):
+        result['stage'] = stage
+        if on_update:
+            try:
+                on_update(result)
+            except Exception as e:
+                print(f"Batch update callback failed: {str(e)}")
+
+    async def process(result):
+        url = result['url']
+        video_id = result['video_id']
+        # a batch is bulk work, a chat question asked meanwhile should not wait behind dozens of summaries
+        with request_priority("background"):
+            await process_video(result, url, video_id)
+
+    async def fetch_transcript(result, url):
+        """
+        transcript of a video that is not in the store yet.
+        streams the audio when possible, otherwise downloads it under the download limit
+        and only then takes a transcription slot.
+        """
+        # download: only look up the audio stream here, the bytes flow during transcription
+        stream = None
+        async with download_slots:
+            move(result, 'download')
+            started = time.time()
+            if cfg.TRANSCRIBE_STREAMING:
+                try:
+                    stream = await asyncio.to_thread(resolve_audio_stream, url)
+                except Exception as e:
+                    print(f"Could not resolve audio stream for {url} ({str(e)}), will download instead")
+            result['timings']['download'] = time.time() - started
+
+        if stream is not None:
+            async with transcribe_slots:
+                move(result, 'transcribe')
+                started = time.time()
+                try:
+                    record = await transcribe_youtube_stream(url, stream)
+                    result['timings']['transcribe'] = time.time() - started
+                    return record
+                except Exception as e:
+                    print(f"Streaming transcription failed for {url} ({str(e)}), falling back to download")
+
+        # a private directory per video, so concurrent downloads never touch each other's files
+        download_dir = tempfile.mkdtemp(prefix="fluxora_audio_")
+        try:
+            async with download_slots:
+                move(result, 'download')
+                started = time.time()
+                audio_path = await asyncio.to_thread(download_youtube_audio, url, download_dir)
+                result['timings']['download'] += time.time() - started
+
+            async with transcribe_slots:
+                move(result, 'transcribe')
+                started = time.time()
+                record = await transcribe_audio_chunked(audio_path)
+                result['timings']['transcribe'] = time.time() - started
+            return record
+        finally:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+    async def process_video(result, url, video_id):
+        try:
+            stored = store.get(video_id) if video_id else None
+            if stored is not None:
+                record = stored
+            else:
+                record = await fetch_transcript(result, url)
+                if video_id and record['transcript'] and record['transcript'].strip():
+                    store.put(video_id, {'video_id': video_id, **record})
+
+            transcript = record['transcript']
+            result['transcript'] = transcript
+            if not transcript or len(transcript.strip()) < 50:
+                raise Exception("no usable transcript, the video might have no audio")
+
+            async with summarize_slots:
+                move(result, 'summarize')
+                started = time.time()
+                if analysis_type == "Enhanced Analysis":
+                    result['analysis'] = await asyncio.to_thread(generate_enhanced_summary, transcript, llm)
+                    result['summary'] = result['analysis']['summary']
+                else:
+                    result['summary'] = await asyncio.to_thread(summarize_text, transcript, llm)
+                result['timings']['summarize'] = time.time() - started
+
+            move(result, 'done')
+        except Exception as e:
+            print(f"Error processing {url}: {str(e)}")
+            result['error'] = str(e)
+            move(result, 'error')
+
+    await asyncio.gather(*(process(result) for result in results))
+    return results
@@ -0,0 +1,76 @@
+# src/blob_store.py
+import hashlib
+import os
+import threading
+import time
+from typing import Optional, Set
+
+from .config import Config
+
+
+def _blob_path(ref: str, root: Optional[str] = None) -> str:
+    root = root or Config().BLOB_STORE_PATH
+    # two level fan out so a big corpus doesn't end up with one huge directory.
+    return os.path.join(root, ref[:2], ref)
+
+
+def put_blob(data: str, root: Optional[str] = None) -> str:
+    """
+    Store `data` (image base64, table html, ...) and return its reference id.
+    the id is the sha256 of the content, so storing the same blob twice is free.
+    """
+    ref = hashlib.sha256(data.encode("utf-8")).hexdigest()
+    path = _blob_path(ref, root)
+    try:
+        # already stored, touch it so sweep_blobs sees it as fresh until the new chunks point to it
+        os.utime(path)
+        return ref
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return ref
+
+
+def get_blob(ref: str, root: Optional[str] = None) -> str:
+    """Load a blob by reference id, returns an empty string if it is missing"""
+    if not ref:
+        return ""
+    try:
+        with open(_blob_path(ref, root), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        print(f"Blob {ref} not found in blob store")
+        return ""
+
+
+def sweep_blobs(referenced: Set[str], min_age_seconds: float = 3600, root: Optional[str] = None) -> int:
+    """
+    Delete blobs whose reference is not in `referenced`, returns how many were deleted.
+    blobs younger than min_age_seconds are kept, an ingest writes its blobs before the chunks
+    that point to them are in chroma.
+    """
+    root = root or Config().BLOB_STORE_PATH
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    now = time.time()
+    for fan_out in os.listdir(root):
+        directory = os.path.join(root, fan_out)
+        if not os.path.isdir(directory):
+            continue
+        for ref in os.listdir(directory):
+            path = os.path.join(directory, ref)
+            if ref in referenced or ref.endswith(".tmp"):
+                continue
+            try:
+                if now - os.path.getmtime(path) < min_age_seconds:
+                    continue
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
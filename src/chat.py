@@ -1,12 +1,16 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from .config import Config
+from .llm_pool import get_chat_model
+from .answer_cache import get_answer_cache
+from .blob_store import get_blob
+from .vectors import get_corpus_version
 
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
 
 
 from langchain_core.messages import HumanMessage, SystemMessage
 
 import base64
+import hashlib
 from PIL import Image
 import io
 
@@ -19,68 +23,61 @@ from langchain.prompts import ChatPromptTemplate
 
 
 
-config = Config()
-llm = ChatGoogleGenerativeAI(
-        model=Config.CHAT_MODEL_BEST,  # e.g., "gemini-1.5-flash", "gemini-pro-vision"
-        api_key=config.GEMINI_API_KEY,
-        temperature=0.7,  # Optional: adjust as needed
-        max_tokens=None,  # Optional: set token limit
-        timeout=None,     # Optional: set timeout
-        max_retries=2,    # Optional: set retry attempts
-        )
+def _get_llm():
+    """the shared chat client, created on first use instead of at import time"""
+    return get_chat_model(Config.CHAT_MODEL_BEST, temperature=0.7)
 
 
 
-def get_respo(
-        query: str,
-        results: List[Dict],
-        chat_history: List[Dict[str,str]] ) -> str:
-    # generate the response to a user query.
-        try:
-            # retrives relevant documents.
+NO_RESULTS_MESSAGE = "Sorry Sir but I could not find any relevant information in the upladed data to answer this query."
 
-            if not results:
-                return "Sorry Sir but I could not find any relevant information in the upladed data to answer this query."
 
-            # build context
+def _build_messages(
+        query: str,
+        results: List[Dict],
+        chat_history: List[Dict[str,str]] ) -> List:
+    # build context
 
-            context_parts = []
-            image_contents = []
+    context_parts = []
+    image_contents = []
 
 
-            for i, doc in enumerate(results):
-                context_part = f" Document {i+1} (source: {doc['metadata'].get('source', 'who knows')}):\n"
+    for i, doc in enumerate(results):
+        context_part = f" Document {i+1} (source: {doc['metadata'].get('source', 'who knows')}):\n"
 
-                # image
-                if doc['metadata'].get('content_type') == 'image':
-                    context_part += f"Image Description: {doc['content']}\n"
-                    # Store image data for potential use
-                    if doc['metadata'].get('image_data'):
-                        image_contents.append({
-                            'data': doc['metadata']['image_data'],
-                            'description': doc['metadata'].get('image_desc', '')
-                            })
-                # table
-                elif doc['metadata'].get('content_type') == 'table':
-                # handel table conent
-                    context_part += f"Table content: {doc['content']}\n"
-                    if doc['metadata'].get('html_content'):
-                        context_part += f"Table HTML: {doc['metadata']['html_content']}\n"
+        # image
+        if doc['metadata'].get('content_type') == 'image':
+            context_part += f"Image Description: {doc['content']}\n"
+            # Store a reference to the image for potential use, the base64 itself is only loaded from the blob store when needed.
+            if doc['metadata'].get('image_ref') or doc['metadata'].get('image_data'):
+                image_contents.append({
+                    'ref': doc['metadata'].get('image_ref', ''),
+                    'data': doc['metadata'].get('image_data', ''),
+                    'description': doc['metadata'].get('image_desc', '')
+                    })
+        # table
+        elif doc['metadata'].get('content_type') == 'table':
+        # handel table conent
+            context_part += f"Table content: {doc['content']}\n"
+            # older entries still have the html inline, newer ones only keep a blob reference.
+            html_content = doc['metadata'].get('html_content') or get_blob(doc['metadata'].get('html_ref', ''))
+            if html_content:
+                context_part += f"Table HTML: {html_content}\n"
 
-                # text
-                else:
-                    context_part += f"Content: {doc['content']}\n"
+        # text
+        else:
+            context_part += f"Content: {doc['content']}\n"
 
 
-                # add the element to context_parts.
-                context_parts.append(context_part)
+        # add the element to context_parts.
+        context_parts.append(context_part)
 
-            # combine all documents into a single string with the record seperator as "\n".
-            full_context = "\n".join(context_parts)
+    # combine all documents into a single string with the record seperator as "\n".
+    full_context = "\n".join(context_parts)
 
 
-            # langchain messages to define the human and system message.
-            prompt = f"""Based on the following context from the uploaded documents, please answer the user's question.
+    # langchain messages to define the human and system message.
+    prompt = f"""Based on the following context from the uploaded documents, please answer the user's question.
 
 Context:
 {full_context}
@@ -90,20 +87,20 @@ User Question: {query}
 Please provide a comprehensive answer based on the context above. If the context includes information from images or tables, make sure to incorporate that information in your response."""
 
 
-            if chat_history:
-                history_text = "\n".join([
-                    # we will use the for loop after the fstring. this is list comprehension.
-                    f"{msg['role']}: {msg['content']}" 
-                    for msg in chat_history[-5:]
-                    ])
+    if chat_history:
+        history_text = "\n".join([
+            # we will use the for loop after the fstring. this is list comprehension.
+            f"{msg['role']}: {msg['content']}" 
+            for msg in chat_history[-5:]
+            ])
 
-                # inside the if statement coz the history could be empty
-                prompt = f"Previous conversation: \n{history_text}\n\n{prompt}"
+        # inside the if statement coz the history could be empty
+        prompt = f"Previous conversation: \n{history_text}\n\n{prompt}"
 
 
-            messages = [
-                    SystemMessage(
-                        content="""You help users understand and analyze documents by answering questions based on the provided context.
+    messages = [
+            SystemMessage(
+                content="""You help users understand and analyze documents by answering questions based on the provided context.
 
             When answering:
             1. Use the provided context from the documents to answer questions accurately
@@ -113,19 +110,92 @@ Please provide a comprehensive answer based on the context above. If the context
             5. If you cannot find relevant information in the context, say so clearly
             6. Always cite which part of the document you're referencing when possible
             """
-            ),
-                    HumanMessage(
-                        content=prompt
-                        )
-                    ] 
+    ),
+            HumanMessage(
+                content=prompt
+                )
+            ]
+
+    return messages
+
 
+def _history_key(chat_history: List[Dict[str,str]]) -> str:
+    # the prompt includes the last 5 turns, so "tell me more" after two different questions must not share an answer.
+    digest = hashlib.sha256()
+    for msg in chat_history[-5:]:
+        digest.update(f"{msg['role']}\x00{msg['content']}\x00".encode("utf-8"))
+    return digest.hexdigest() if chat_history else ""
 
-            respo = llm.invoke(messages)
+
+def _chunk_ids(results: List[Dict]) -> List[str]:
+    # chunks stored before doc_id existed fall back to their element id.
+    return [doc['metadata'].get('doc_id') or f"{doc['metadata'].get('source')}:{doc['metadata'].get('id')}" for doc in results]
+
+
+def get_respo(
+        query: str,
+        results: List[Dict],
+        chat_history: List[Dict[str,str]] ) -> str:
+    # generate the response to a user query.
+        try:
+            # retrives relevant documents.
+
+            if not results:
+                return NO_RESULTS_MESSAGE
+
+            messages = _build_messages(query, results, chat_history)
+
+            respo = _get_llm().invoke(messages)
             return respo.content
 
         except Exception as e:
             return f"Sorry Sir, but there is an error while processing the questoins through the llm: {str(e)}"
 
+
+def stream_respo(
+        query: str,
+        results: List[Dict],
+        chat_history: List[Dict[str,str]],
+        store=None,
+        query_embedding: Optional[List[float]] = None ) -> Iterator[str]:
+    """
+    streaming version of get_respo, yields the answer piece by piece as the llm generates it
+    (made for st.write_stream). when store and query_embedding are given, answers are reused for near identical
+    questions that retrieved the same chunks after the same conversation, as long as the collection hasn't been
+    changed by an ingest in the meantime. a cached answer is yielded in one piece.
+    """
+    try:
+        if not results:
+            yield NO_RESULTS_MESSAGE
+            return
+
+        use_cache = store is not None and query_embedding is not None
+        if use_cache:
+            scope = store._collection.name
+            chunk_ids = _chunk_ids(results)
+            corpus_version = get_corpus_version(store)
+            cache = get_answer_cache()
+            history_key = _history_key(chat_history)
+            cached = cache.lookup(scope, query_embedding, chunk_ids, corpus_version, history_key)
+            if cached is not None:
+                yield cached
+                return
+
+        answer_parts = []
+        for chunk in _get_llm().stream(_build_messages(query, results, chat_history)):
+            # gemini can send empty chunks (e.g. the final one with usage data), skip those.
+            if isinstance(chunk.content, str) and chunk.content:
+                answer_parts.append(chunk.content)
+                yield chunk.content
+
+        # only cache answers that streamed all the way through and actually say something.
+        answer = "".join(answer_parts)
+        if use_cache and answer.strip():
+            cache.put(scope, query_embedding, chunk_ids, corpus_version, answer, history_key)
+
+    except Exception as e:
+        yield f"Sorry Sir, but there is an error while processing the questoins through the llm: {str(e)}"
+
 def analyze_image_with_query(self, image_base64: str, query: str) -> str:
     """Analyze a specific image with a user query"""
     try:
@@ -150,7 +220,7 @@ def analyze_image_with_query(self, image_base64: str, query: str) -> str:
             ])
 
         # Generate response with image
-        chain = prompt | llm  
+        chain = prompt | _get_llm()
         response = chain.invoke(
                 {
                     "image_data": image_base64,
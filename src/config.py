@@ -25,19 +25,69 @@ class Config:
     # ChromaDB Configuration
     CHROMA_DB_PATH: str = "./chroma_db"
     COLLECTION_NAME: str = "gemini_rag_collection"
+    BLOB_STORE_PATH: str = "./blob_store"  # images and table html referenced from chroma metadata
+    SESSION_COLLECTION_PREFIX: str = "session_"  # every browser session gets its own collection
+    SESSION_COLLECTION_TTL_HOURS: int = 24  # session collections unused for this long are dropped
+    SESSION_PRUNE_INTERVAL_MINUTES: int = 30  # how often expired session collections are looked for
+    MAX_IN_MEMORY_COLLECTIONS: int = 16  # collections whose keyword index and cached answers stay in memory
     
     # Processing Configuration
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
     MAX_RETRIEVAL_RESULTS: int = 5
+    HYBRID_FETCH_K: int = 20  # candidates taken from each of the vector and keyword searches
+    HYBRID_RRF_K: int = 60  # reciprocal rank fusion constant
+
+    # Chat answer cache
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # cosine similarity two questions need to share an answer
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 500  # per collection
     
     # Image Processing
     MAX_IMAGE_SIZE: Tuple[int, int] = DEFAULT_MAX_IMAGE_SIZE
     SUPPORTED_IMAGE_FORMATS: List[str] = field(default_factory=lambda: DEFAULT_SUPPORTED_FORMATS.copy())
     
     # Rate Limiting (Free Tier Limits)
-    MAX_REQUESTS_PER_MINUTE: int = 10
+    MAX_REQUESTS_PER_MINUTE: int = 10  # per model, unless MODEL_RATE_LIMITS says otherwise
+    MODEL_RATE_LIMITS: Dict[str, int] = field(default_factory=dict)  # model name -> requests per minute
+    RATE_LIMIT_BURST: int = 2  # requests a model can take at once on top of its per minute rate
     MAX_TOKENS_PER_REQUEST: int = 32768
+
+    # Audio for transcription
+    AUDIO_FORMAT: str = "native"  # "native" (no transcode), "opus", "flac" or "wav"
+    AUDIO_OPUS_BITRATE_KBPS: int = 32
+    TRANSCRIBE_STREAMING: bool = True  # pipe audio from youtube straight into deepgram, no temp file
+    AUDIO_STREAM_CHUNK_BYTES: int = 256 * 1024
+    TRANSCRIBE_SEGMENT_SECONDS: int = 600  # longer audio is split and transcribed in parallel
+    TRANSCRIBE_SEGMENT_OVERLAP_SECONDS: int = 4
+    TRANSCRIBE_MAX_CONCURRENCY: int = 4
+    TRANSCRIBE_SEGMENT_RETRIES: int = 2
+    BATCH_MAX_VIDEOS: int = 100
+    BATCH_DOWNLOAD_CONCURRENCY: int = 6  # each batch stage has its own limit
+    BATCH_TRANSCRIBE_CONCURRENCY: int = 3
+    BATCH_SUMMARY_CONCURRENCY: int = 2
+
+    # Concurrency
+    INGEST_WORKERS: int = 2  # uploaded pdfs processed at the same time, across all sessions
+    LAYOUT_PROCESSES: int = 0  # processes for the hi_res layout pass of multi file uploads, 0 = one per core
+    IMAGE_ANALYSIS_WORKERS: int = 4  # how many images are sent to the vision model at once
+    QUIZ_MAX_CONCURRENCY: int = 5  # quiz questions generated at once
+    QUIZ_BANK_TARGET: int = 15  # unseen questions per topic the background fill aims for
+    QUIZ_BANK_LOW_WATER: int = 5  # refill a topic once fewer unseen questions than this are left
+    QUIZ_BANK_WORKERS: int = 2  # topics filled at the same time in the background
+    SUMMARY_CHUNK_CHARS: int = 24000  # map-reduce chunk size for long texts
+    SUMMARY_CHUNK_OVERLAP: int = 500
+    SUMMARY_MAX_CONCURRENCY: int = 4  # chunk summaries generated at once
+    EMBEDDING_BATCH_SIZE: int = 100  # texts per embedding request (the gemini batch limit)
+    EMBEDDING_WORKERS: int = 4  # embedding requests in flight at once
+    EMBEDDING_MAX_RETRIES: int = 5
+    EMBEDDING_RETRY_BASE_DELAY: float = 2.0  # seconds, doubled on every retry
+
+    # Local caches
+    CACHE_DIR: str = "./cache"
+    IMAGE_CACHE_MAX_BYTES: int = 50 * 1024 * 1024
+    INGEST_CACHE_MAX_BYTES: int = 500 * 1024 * 1024
+    TRANSCRIPT_CACHE_MAX_BYTES: int = 200 * 1024 * 1024
     
 
     
@@ -0,0 +1,86 @@
+# src/disk_cache.py
+import os
+import threading
+from typing import Optional
+
+
+class DiskCache:
+    """
+    Size bounded key -> bytes store on the local disk.
+    every entry is one file named `<key><suffix>` inside cache_dir.
+    the file mtime is used as the "last used" time for LRU eviction.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, suffix: str = ".bin"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # running total so we don't have to walk the directory on every put.
+        self.total_bytes = sum(
+            os.path.getsize(os.path.join(self.cache_dir, name))
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(self.suffix)
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        with self.lock:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                # touch the file so it counts as recently used.
+                os.utime(path)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return data
+
+    def put_bytes(self, key: str, data: bytes):
+        path = self._path(key)
+        with self.lock:
+            if os.path.exists(path):
+                self.total_bytes -= os.path.getsize(path)
+            # write to a temp file first so a crash never leaves half an entry behind.
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.total_bytes += len(data)
+
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """delete least recently used entries until we are back under max_bytes. caller holds the lock."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.suffix):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        entries.sort()
+        for _, size, name in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                self.total_bytes -= size
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes": self.total_bytes,
+            }
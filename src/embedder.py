@@ -0,0 +1,92 @@
+# src/embedder.py
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import Config
+from .embedding_cache import get_embedding_cache
+from .ratelimit import current_priority, get_limiter
+
+# bits of error messages that mean "try again later" rather than "this will never work".
+_RETRYABLE_MARKERS = ("429", "quota", "exhausted", "rate limit", "500", "503", "unavailable", "timeout", "timed out")
+
+
+def _is_retryable(error: Exception) -> bool:
+    message = f"{type(error).__name__} {error}".lower()
+    return any(marker in message for marker in _RETRYABLE_MARKERS)
+
+
+def _embed_batch(embeddings, texts: List[str], config: Config, priority: str) -> List[List[float]]:
+    """embed one batch, waiting for the shared bucket and backing off on quota errors"""
+    limiter = get_limiter(config.EMBEDDING_MODEL)
+    for attempt in range(config.EMBEDDING_MAX_RETRIES + 1):
+        limiter.acquire(priority=priority)
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt >= config.EMBEDDING_MAX_RETRIES or not _is_retryable(e):
+                raise
+            # exponential backoff with a bit of jitter so the workers don't retry in lockstep.
+            delay = config.EMBEDDING_RETRY_BASE_DELAY * (2 ** attempt) + random.uniform(0, 1)
+            print(f"Embedding batch failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def embed_texts(
+        embeddings,
+        texts: List[str],
+        on_batch: Optional[Callable[[List[int], List[List[float]]], None]] = None,
+        config: Optional[Config] = None,
+        ) -> Tuple[List[List[float]], Dict[str, float]]:
+    """
+    Embed `texts` in batches of EMBEDDING_BATCH_SIZE with EMBEDDING_WORKERS batches in flight.
+    texts already in the local embedding cache are not sent to the api at all.
+    `on_batch(positions, vectors)` is called as batches finish so the caller can write them out
+    without waiting for the whole corpus. returns the vectors in input order and throughput stats.
+    """
+    config = config or Config()
+    started = time.perf_counter()
+    cache = get_embedding_cache(config.EMBEDDING_MODEL)
+
+    vectors: List[Optional[List[float]]] = cache.get_many(texts)
+    cached_positions = [i for i, vector in enumerate(vectors) if vector is not None]
+    batch_size = max(1, config.EMBEDDING_BATCH_SIZE)
+    if on_batch:
+        # same batch size as the api batches, one huge write could go over what the store takes at once.
+        for start in range(0, len(cached_positions), batch_size):
+            positions = cached_positions[start:start + batch_size]
+            on_batch(positions, [vectors[i] for i in positions])
+
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    batches = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+
+    if batches:
+        workers = max(1, min(config.EMBEDDING_WORKERS, len(batches)))
+        # the pool threads don't see the caller's context, hand them its priority explicitly.
+        priority = current_priority()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_embed_batch, embeddings, [texts[i] for i in positions], config, priority)
+                for positions in batches
+            ]
+            for positions, future in zip(batches, futures):
+                batch_vectors = future.result()
+                cache.put_many([texts[i] for i in positions], batch_vectors)
+                for i, vector in zip(positions, batch_vectors):
+                    vectors[i] = vector
+                if on_batch:
+                    on_batch(positions, batch_vectors)
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "chunks": len(texts),
+        "cached": len(cached_positions),
+        "batches": len(batches),
+        "seconds": elapsed,
+        "chunks_per_sec": len(texts) / elapsed if elapsed > 0 else 0.0,
+    }
+    if texts:
+        print(f"Embedded {len(texts)} chunks ({len(cached_positions)} from cache) in {elapsed:.2f}s "
+              f"({stats['chunks_per_sec']:.1f} chunks/sec)")
+    return vectors, stats
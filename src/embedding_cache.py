@@ -0,0 +1,140 @@
+# src/embedding_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .config import Config
+
+
+def normalize_text(text: str) -> str:
+    """whitespace differences between two copies of a chunk shouldn't make them different chunks"""
+    return " ".join(text.split())
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Local embedding cache for one embedding model.
+    vectors live in an append only float32 file that is read through a numpy memmap,
+    and `keys.txt` holds one text hash per line, line i being row i of the matrix.
+    so adding entries is just two appends and nothing has to be rewritten.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.keys_path = os.path.join(cache_dir, "keys.txt")
+        self.meta_path = os.path.join(cache_dir, "meta.json")
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.dim: Optional[int] = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+
+        self.index: Dict[str, int] = {}
+        self._matrix = None
+        self._load_index()
+
+    def _load_index(self):
+        if self.dim is None or not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, "r", encoding="utf-8") as f:
+            keys = f.read().split()
+        # vectors are written before keys, so a crash between the two appends leaves extra rows behind.
+        # cut the matrix back to the keys we have so row numbers stay in step.
+        row_bytes = self.dim * 4
+        rows = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        keys = keys[:rows]
+        if rows > len(keys):
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(len(keys) * row_bytes)
+        for row, key in enumerate(keys):
+            self.index[key] = row
+
+    def _get_matrix(self):
+        """memmap over the rows we know about, reopened only when the file has grown"""
+        rows = len(self.index)
+        if rows == 0:
+            return None
+        if self._matrix is None or self._matrix.shape[0] < rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._matrix
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """cached vector for every text, or None where it isn't cached yet"""
+        keys = [text_key(text) for text in texts]
+        with self.lock:
+            matrix = self._get_matrix()
+            results: List[Optional[List[float]]] = []
+            for key in keys:
+                row = self.index.get(key)
+                if row is None or matrix is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(matrix[row].tolist())
+            return results
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        if not texts:
+            return
+        with self.lock:
+            new_keys = []
+            new_vectors = []
+            seen = set()
+            for text, vector in zip(texts, vectors):
+                key = text_key(text)
+                if key not in self.index and key not in seen:
+                    seen.add(key)
+                    new_keys.append(key)
+                    new_vectors.append(vector)
+            if not new_keys:
+                return
+
+            matrix = np.asarray(new_vectors, dtype=np.float32)
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim}, f)
+            elif matrix.shape[1] != self.dim:
+                print(f"Embedding cache dim mismatch ({matrix.shape[1]} != {self.dim}), not caching")
+                return
+
+            start = len(self.index)
+            with open(self.vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self.keys_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{key}\n" for key in new_keys))
+            for offset, key in enumerate(new_keys):
+                self.index[key] = start + offset
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.index)}
+
+
+_embedding_caches: Dict[str, EmbeddingCache] = {}
+_embedding_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model: str) -> EmbeddingCache:
+    """Get the process wide cache for `model`, creating it lazily on first use"""
+    with _embedding_caches_lock:
+        if model not in _embedding_caches:
+            # "models/embedding-001" -> "models_embedding-001"
+            slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+            _embedding_caches[model] = EmbeddingCache(os.path.join(Config().CACHE_DIR, "embeddings", slug))
+        return _embedding_caches[model]
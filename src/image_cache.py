@@ -0,0 +1,51 @@
+# src/image_cache.py
+import hashlib
+import os
+import threading
+from typing import Optional
+
+from .config import Config
+from .disk_cache import DiskCache
+
+
+class ImageDescriptionCache(DiskCache):
+    """
+    On disk cache for vision model image descriptions.
+    every entry is named after the sha256 of (image bytes, prompt, model),
+    so the same figure or logo is only ever described once no matter which pdf it came from.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        super().__init__(cache_dir, max_bytes, suffix=".txt")
+
+    @staticmethod
+    def make_key(image_bytes: bytes, prompt: str, model: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(image_bytes)
+        digest.update(prompt.encode("utf-8"))
+        digest.update(model.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        data = self.get_bytes(key)
+        return data.decode("utf-8") if data is not None else None
+
+    def put(self, key: str, description: str):
+        self.put_bytes(key, description.encode("utf-8"))
+
+
+_image_cache = None  # lazy singleton
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageDescriptionCache:
+    """Get the process wide image description cache, creating it lazily on first use"""
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            cfg = Config()
+            _image_cache = ImageDescriptionCache(
+                os.path.join(cfg.CACHE_DIR, "image_desc"),
+                cfg.IMAGE_CACHE_MAX_BYTES,
+            )
+    return _image_cache
@@ -0,0 +1,42 @@
+# src/import_profile.py
+import importlib
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+# module name -> how long its first import took and what it pulled in, for the whole process.
+_import_times: Dict[str, Dict[str, Any]] = {}
+_import_lock = threading.Lock()
+
+
+def timed_import(module_name: str):
+    """
+    Import a module, remembering how long the first import took and which top level packages it loaded.
+    later calls are just a dict lookup in sys.modules, so this is cheap to call on every rerun.
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    with _import_lock:
+        before = set(sys.modules)
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        elapsed = time.perf_counter() - started
+
+        if module_name not in _import_times:
+            new_packages = sorted({name.split(".")[0] for name in set(sys.modules) - before})
+            _import_times[module_name] = {
+                "seconds": elapsed,
+                "modules_loaded": len(set(sys.modules) - before),
+                "packages": new_packages,
+            }
+            print(f"Imported {module_name} in {elapsed:.2f}s ({len(new_packages)} new packages)")
+    return module
+
+
+def import_report() -> List[Dict[str, Any]]:
+    """first import cost of every module loaded through timed_import, slowest first"""
+    with _import_lock:
+        report = [{"module": name, **info} for name, info in _import_times.items()]
+    return sorted(report, key=lambda row: row["seconds"], reverse=True)
@@ -0,0 +1,79 @@
+# src/ingest_cache.py
+import hashlib
+import json
+import os
+import threading
+from typing import List, Dict, Any, Optional
+
+import zstandard
+
+from .config import Config
+from .disk_cache import DiskCache
+
+# bump this whenever process_pdf changes the shape of the elements it returns,
+# so old cache entries are simply never looked up again.
+INGEST_FORMAT_VERSION = 1
+
+
+def hash_file(path: str) -> str:
+    """sha256 of a file, read in blocks so big pdfs don't have to fit in memory"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestCache(DiskCache):
+    """
+    Caches the full processed element list of a pdf.
+    the key is the file hash plus everything that changes what process_pdf returns
+    (chunking config and vision model), and entries are zstd compressed json.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        super().__init__(cache_dir, max_bytes, suffix=".json.zst")
+
+    @staticmethod
+    def make_key(file_hash: str, config: Config) -> str:
+        parts = [
+            file_hash,
+            str(config.CHUNK_SIZE),
+            str(config.CHUNK_OVERLAP),
+            config.VISION_MODEL,
+            str(INGEST_FORMAT_VERSION),
+        ]
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        data = self.get_bytes(key)
+        if data is None:
+            return None
+        try:
+            return json.loads(zstandard.ZstdDecompressor().decompress(data))
+        except Exception as e:
+            # a broken entry is just a miss, it will be overwritten on the next put.
+            print(f"Could not read ingest cache entry {key}: {e}")
+            return None
+
+    def put(self, key: str, elements: List[Dict[str, Any]]):
+        # unstructured metadata can hold values json doesn't know about, default=str keeps them readable.
+        raw = json.dumps(elements, default=str).encode("utf-8")
+        self.put_bytes(key, zstandard.ZstdCompressor(level=3).compress(raw))
+
+
+_ingest_cache = None  # lazy singleton
+_ingest_cache_lock = threading.Lock()
+
+
+def get_ingest_cache() -> IngestCache:
+    """Get the process wide ingest cache, creating it lazily on first use"""
+    global _ingest_cache
+    with _ingest_cache_lock:
+        if _ingest_cache is None:
+            cfg = Config()
+            _ingest_cache = IngestCache(
+                os.path.join(cfg.CACHE_DIR, "ingest"),
+                cfg.INGEST_CACHE_MAX_BYTES,
+            )
+    return _ingest_cache
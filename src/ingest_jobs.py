@@ -0,0 +1,170 @@
+# src/ingest_jobs.py
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .config import Config
+from .ratelimit import request_priority
+
+# states a job goes through, "done" and "error" are final.
+JOB_STATES = ["queued", "parsing", "describing", "embedding", "done", "error"]
+
+
+class IngestJob:
+    """
+    One or more uploaded pdfs on their way into a vector store.
+    the worker updates the counters through `progress`, the ui reads them with `snapshot`.
+    """
+
+    def __init__(self, name: str, pdf_paths: List[str]):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.pdf_paths = pdf_paths
+        self.state = "queued"
+        self.files_done = 0
+        self.pages = 0
+        self.images_done = 0
+        self.images_total = 0
+        self.chunks_done = 0
+        self.chunks_total = 0
+        self.elements = 0
+        self.error: Optional[str] = None
+        self.warnings: List[str] = []
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def _advance(self, state: str):
+        # with several files one can still be parsing while another is describing, show the furthest one
+        if JOB_STATES.index(state) > JOB_STATES.index(self.state):
+            self.state = state
+
+    def progress(self, stage: str, done: int, total: int):
+        """progress callback for process_pdf, process_pdfs and add_documents"""
+        with self.lock:
+            if stage == "files":
+                self._advance("parsing")
+                self.files_done = done
+            elif stage == "pages":
+                self._advance("parsing")
+                self.pages = done
+            elif stage == "images":
+                self._advance("describing")
+                self.images_done, self.images_total = done, total
+            elif stage == "chunks":
+                self._advance("embedding")
+                self.chunks_done, self.chunks_total = done, total
+
+    def finish(self, error: Optional[str] = None):
+        with self.lock:
+            self.state = "error" if error else "done"
+            self.error = error
+            self.finished = time.time()
+
+    @property
+    def active(self) -> bool:
+        return self.state not in ("done", "error")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "id": self.id,
+                "name": self.name,
+                "state": self.state,
+                "files": len(self.pdf_paths),
+                "pdf_paths": list(self.pdf_paths),
+                "files_done": self.files_done,
+                "pages": self.pages,
+                "images_done": self.images_done,
+                "images_total": self.images_total,
+                "chunks_done": self.chunks_done,
+                "chunks_total": self.chunks_total,
+                "elements": self.elements,
+                "error": self.error,
+                "warnings": list(self.warnings),
+                "seconds": (self.finished or time.time()) - self.created,
+            }
+
+
+class IngestJobQueue:
+    """
+    In process worker pool for pdf ingestion.
+    jobs run outside the streamlit script run, so a big pdf doesn't block the user's page
+    and uploads from many sessions are processed side by side (up to INGEST_WORKERS at once).
+    """
+
+    def __init__(self, workers: int):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest")
+        self.jobs: Dict[str, IngestJob] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, name: str, pdf_paths: List[str], store, processor, remove_file: bool = True) -> str:
+        """
+        queue pdfs for parsing and embedding into `store`, returns the job id.
+        several files are laid out in parallel processes and embedded together, see PDF_processor.process_pdfs.
+        """
+        self.prune()
+        job = IngestJob(name, pdf_paths)
+        with self.lock:
+            self.jobs[job.id] = job
+        self.pool.submit(self._run, job, store, processor, remove_file)
+        return job.id
+
+    def _run(self, job: IngestJob, store, processor, remove_file: bool):
+        from .vectors import add_documents
+        try:
+            # nobody waits on the page for this, image descriptions and embeddings queue behind chat.
+            # the pool thread doesn't inherit the caller's context, so the priority is set here.
+            with request_priority("background"):
+                if len(job.pdf_paths) == 1:
+                    elements = processor.process_pdf(job.pdf_paths[0], progress=job.progress)
+                else:
+                    elements, failures = processor.process_pdfs(job.pdf_paths, progress=job.progress)
+                    if len(failures) == len(job.pdf_paths):
+                        raise Exception("; ".join(failures.values()))
+                    with job.lock:
+                        job.warnings.extend(f"{os.path.basename(path)}: {error}" for path, error in failures.items())
+                job.elements = len(elements)
+                add_documents(store, elements, progress=job.progress)
+            job.finish()
+        except Exception as e:
+            print(f"Ingest job {job.name} failed: {e}")
+            job.finish(str(e))
+        finally:
+            if remove_file:
+                for pdf_path in job.pdf_paths:
+                    try:
+                        os.remove(pdf_path)
+                    except OSError:
+                        pass
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def snapshots(self, job_ids: List[str]) -> List[Dict[str, Any]]:
+        return [job.snapshot() for job in (self.get(job_id) for job_id in job_ids) if job is not None]
+
+    def prune(self, max_age_seconds: float = 3600):
+        """forget finished jobs nobody looked at for a while"""
+        now = time.time()
+        with self.lock:
+            for job_id in [job_id for job_id, job in self.jobs.items()
+                           if job.finished and now - job.finished > max_age_seconds]:
+                del self.jobs[job_id]
+
+
+_ingest_queue = None  # lazy singleton
+_ingest_queue_lock = threading.Lock()
+
+
+def get_ingest_queue() -> IngestJobQueue:
+    """Get the process wide ingest queue, creating it lazily on first use"""
+    global _ingest_queue
+    with _ingest_queue_lock:
+        if _ingest_queue is None:
+            _ingest_queue = IngestJobQueue(Config().INGEST_WORKERS)
+    return _ingest_queue
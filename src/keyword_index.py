@@ -0,0 +1,192 @@
+# src/keyword_index.py
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# words plus things like "A-113", "4.2.1" or "ISO/IEC" that embeddings tend to blur.
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._/-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """lowercase tokens, compound identifiers are kept whole and also split into their parts"""
+    tokens = []
+    for match in _TOKEN_RE.findall(text.lower()):
+        tokens.append(match)
+        if not match.isalnum():
+            tokens.extend(part for part in re.split(r"[._/-]", match) if part)
+    return tokens
+
+
+class KeywordIndex:
+    """
+    In memory BM25 inverted index.
+    postings map term -> {doc id: term frequency}, so a search only touches the documents
+    that contain at least one of the query terms instead of scanning the whole corpus.
+    on top of that every term keeps its `max_postings_per_term` highest impact postings in order
+    (impact = the bm25 part that doesn't depend on the query). a search walks those lists and stops as soon
+    as nothing further down can reach the top k, candidates are scored exactly. terms with more postings
+    than the cap are only searched through their best ones, so for queries made of very common terms the
+    result can miss a few documents of the exact bm25 top k.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_postings_per_term: int = 1000):
+        self.k1 = k1
+        self.b = b
+        self.max_postings_per_term = max_postings_per_term
+        # term -> [(-impact, doc id)] best first, kept up to date on add.
+        self.top_postings: Dict[str, List[Tuple[float, str]]] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.doc_terms: Dict[str, List[str]] = {}
+        self.docs: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self.total_length = 0
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None):
+        metadatas = metadatas or [{} for _ in ids]
+        k1_plus_one = self.k1 + 1
+        with self.lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self.doc_lengths:
+                    self._remove_one(doc_id)
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                self.doc_lengths[doc_id] = length
+                self.doc_terms[doc_id] = list(counts)
+                self.docs[doc_id] = (text, metadata or {})
+                self.total_length += length
+                norm = self._norm(length)
+                for term, tf in counts.items():
+                    posting = self.postings.get(term)
+                    if posting is None:
+                        posting = self.postings[term] = {}
+                        self.top_postings[term] = []
+                    posting[doc_id] = tf
+                    top = self.top_postings.get(term)
+                    if top is None:
+                        # dropped by a remove, it is rebuilt from the postings on the next search
+                        continue
+                    impact = -tf * k1_plus_one / (tf + norm)
+                    if len(top) < self.max_postings_per_term:
+                        # the list still holds every posting of the term
+                        bisect.insort(top, (impact, doc_id))
+                    elif impact < top[-1][0]:
+                        bisect.insort(top, (impact, doc_id))
+                        top.pop()
+
+    def remove(self, ids: List[str]):
+        with self.lock:
+            for doc_id in ids:
+                if doc_id in self.doc_lengths:
+                    self._remove_one(doc_id)
+
+    def _norm(self, length: int) -> float:
+        # uses the average length at the time it is computed. that is good enough for ordering the
+        # top lists, the final scores are always computed exactly.
+        avg_length = self.total_length / len(self.doc_lengths) if self.doc_lengths else 1.0
+        return self.k1 * (1 - self.b + self.b * length / max(avg_length, 1e-9))
+
+    def _top(self, term: str) -> List[Tuple[float, str]]:
+        top = self.top_postings.get(term)
+        if top is None:
+            top = heapq.nsmallest(
+                self.max_postings_per_term,
+                ((-tf * (self.k1 + 1) / (tf + self._norm(self.doc_lengths[doc_id])), doc_id)
+                 for doc_id, tf in self.postings[term].items()),
+            )
+            self.top_postings[term] = top
+        return top
+
+    def _remove_one(self, doc_id: str):
+        for term in self.doc_terms.pop(doc_id):
+            # the removed doc could be in the top list and nothing below it is kept, rebuild on next use
+            self.top_postings.pop(term, None)
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        self.docs.pop(doc_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.postings.clear()
+            self.doc_lengths.clear()
+            self.doc_terms.clear()
+            self.docs.clear()
+            self.top_postings.clear()
+            self.total_length = 0
+
+    def get(self, doc_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        return self.docs.get(doc_id)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """top k (doc id, bm25 score) pairs for `query`, best first"""
+        with self.lock:
+            n_docs = len(self.doc_lengths)
+            if n_docs == 0:
+                return []
+            avg_length = self.total_length / n_docs
+
+            terms = [term for term in set(tokenize(query)) if term in self.postings]
+            idfs = {}
+            for term in terms:
+                df = len(self.postings[term])
+                idfs[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+            tops = {term: self._top(term) for term in terms}
+
+            def exact_score(doc_id: str) -> float:
+                # full bm25 with dict lookups instead of walking the postings
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                score = 0.0
+                for term in terms:
+                    tf = self.postings[term].get(doc_id)
+                    if tf:
+                        score += idfs[term] * tf * (self.k1 + 1) / (tf + norm)
+                return score
+
+            # threshold algorithm: walk the impact ordered lists a bit deeper every round and score every new
+            # document exactly. a document not seen yet can score at most the sum of the impacts at the current
+            # depth, once the k-th best score beats that nothing unseen can get into the top k.
+            scores: Dict[str, float] = {}
+            start, depth = 0, max(4 * k, 32)
+            while True:
+                for term in terms:
+                    for _, doc_id in tops[term][start:depth]:
+                        if doc_id not in scores:
+                            scores[doc_id] = exact_score(doc_id)
+
+                bound = 0.0
+                for term in terms:
+                    top = tops[term]
+                    if depth < len(top):
+                        bound -= idfs[term] * top[depth][0]
+                    elif len(top) < len(self.postings[term]):
+                        # capped list, whatever is below it has at most the impact of its last entry
+                        bound -= idfs[term] * top[-1][0]
+
+                best = heapq.nlargest(k, scores.values())
+                exhausted = all(depth >= len(tops[term]) for term in terms)
+                if exhausted or (len(best) == k and best[-1] >= bound):
+                    break
+                start, depth = depth, depth * 2
+
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """merge several ranked id lists, ids ranked high in any list float to the top"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
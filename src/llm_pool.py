@@ -0,0 +1,60 @@
+# src/llm_pool.py
+import asyncio
+import threading
+from typing import Dict, Optional, Tuple
+
+from langchain_core.rate_limiters import BaseRateLimiter
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from .config import Config
+from .ratelimit import get_limiter
+
+# one client per (model, temperature, transport), shared by every session of the process.
+_chat_models: Dict[Tuple[str, float, Optional[str]], ChatGoogleGenerativeAI] = {}
+_chat_models_lock = threading.Lock()
+
+
+class SchedulerRateLimiter(BaseRateLimiter):
+    """
+    Lets langchain wait on our scheduler before every request of a model, so chat, quiz, vision
+    and summaries all queue on the same per model bucket, with the priority of the calling context.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        return get_limiter(self.name).acquire(blocking=blocking)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        # to_thread copies the context, so the priority comes along
+        return await asyncio.to_thread(self.acquire, blocking=blocking)
+
+
+def get_chat_model(model: Optional[str] = None, temperature: float = 0.7, transport: Optional[str] = None) -> ChatGoogleGenerativeAI:
+    """
+    Get the shared chat client for this model, temperature and transport, creating it on first use.
+    a client keeps its http connections open, so only the first request pays for the setup and the tls handshake.
+    transport=None is the library default (grpc), "rest" is for code that runs inside an event loop.
+    """
+    cfg = Config()
+    model = model or cfg.CHAT_MODEL_BEST
+    key = (model, float(temperature), transport)
+    with _chat_models_lock:
+        llm = _chat_models.get(key)
+        if llm is None:
+            kwargs = {}
+            if transport:
+                kwargs["transport"] = transport
+            llm = ChatGoogleGenerativeAI(
+                model=model,
+                google_api_key=cfg.GEMINI_API_KEY,
+                temperature=temperature,
+                max_tokens=None,
+                timeout=None,
+                max_retries=2,
+                rate_limiter=SchedulerRateLimiter(model),
+                **kwargs,
+            )
+            _chat_models[key] = llm
+    return llm
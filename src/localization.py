@@ -5,6 +5,9 @@ from pathlib import Path
 from typing import List, Dict, Any
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
+from .mapreduce import condense_text
+from .llm_pool import get_chat_model
+from .session import get_session_processor, get_session_store, get_session_upload_dir
 
 def get_language_options():
     """Return comprehensive list of languages for localization"""
@@ -168,6 +171,13 @@ def generate_localized_summary(elements: List[Dict[str, Any]], target_language:
     # Detect document type for appropriate localization strategy
     doc_type = detect_document_type(elements)
     
+    # long documents are condensed with map-reduce first so the localization prompt always fits
+    try:
+        audience = "a general" if doc_type == "general" else f"a {doc_type}"
+        full_content = condense_text(full_content, model, focus=f"content that matters for {audience} audience in another culture")
+    except Exception as e:
+        return f"Error generating localized summary: {str(e)}"
+    
     # Create localization prompt based on document type
     localization_strategies = {
         "business": """
@@ -316,26 +326,22 @@ def render_localization_ui():
                 try:
                     # Save uploaded file temporarily
                     safe_name = Path(uploaded_file.name).name
-                    temp_path = f"temp_localization_{safe_name}"
+                    temp_path = os.path.join(get_session_upload_dir(), f"temp_localization_{safe_name}")
                     
                     with open(temp_path, "wb") as f:
                         f.write(uploaded_file.getbuffer())
                     
                     # Process PDF using existing pdf_processor
-                    elements = st.session_state.pdf_processor.process_pdf(temp_path)
+                    elements = get_session_processor().process_pdf(temp_path)
                     
                     # Store in vector database for potential future queries
                     from src.vectors import add_documents
-                    add_documents(st.session_state.vector_store, elements)
+                    add_documents(get_session_store(), elements)
                     
                     # Initialize model for localization (reuse config)
-                    localization_model = ChatGoogleGenerativeAI(
-                        model=st.session_state.config.VISION_MODEL,
-                        api_key=st.session_state.config.GEMINI_API_KEY,
+                    localization_model = get_chat_model(
+                        st.session_state.config.VISION_MODEL,
                         temperature=0.3,  # Lower temperature for more consistent localization
-                        max_tokens=None,
-                        timeout=None,
-                        max_retries=2
                     )
                     
                     # Generate localized summary
@@ -0,0 +1,108 @@
+# src/mapreduce.py
+from typing import List, Optional
+
+from .config import Config
+
+# rough chars per token for gemini on english text, only used to size the chunks.
+CHARS_PER_TOKEN = 4
+
+# safety net, every level should at least halve the text so real inputs never get close.
+MAX_REDUCE_LEVELS = 8
+
+
+def split_text(text: str, chunk_chars: int, overlap_chars: int = 0) -> List[str]:
+    """
+    Split text into chunks of at most chunk_chars, preferring paragraph and then sentence boundaries
+    so a chunk doesn't end in the middle of a thought.
+    """
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            # look for a nice place to cut in the second half of the window.
+            window_start = start + chunk_chars // 2
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, window_start, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap_chars, start + 1)
+    return chunks
+
+
+def _summarize_all(llm, prompts: List[str], config: Config) -> List[str]:
+    """run the prompts concurrently, keeping order. a failed chunk keeps a marker instead of failing everything"""
+    results = llm.batch(
+        prompts,
+        config={"max_concurrency": config.SUMMARY_MAX_CONCURRENCY},
+        return_exceptions=True,
+    )
+    summaries = []
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"Error summarizing part {i+1}: {str(result)}")
+            summaries.append(f"[part {i+1} could not be summarized]")
+        else:
+            summaries.append(getattr(result, "content", str(result)))
+    return summaries
+
+
+def condense_text(text: str, llm, focus: str = "", config: Optional[Config] = None) -> str:
+    """
+    Make `text` fit into one request.
+    text that already fits is returned as is. longer text is split into chunks that are summarized in parallel (map),
+    then the partial summaries are merged group by group, again in parallel, until what is left fits (reduce).
+    the number of sequential llm rounds grows with the depth of that tree, not with the length of the text.
+    """
+    config = config or Config()
+    # half the request budget for the text, the rest is for the prompt around it and the answer.
+    max_chars = config.MAX_TOKENS_PER_REQUEST * CHARS_PER_TOKEN // 2
+    if len(text) <= max_chars:
+        return text
+
+    chunk_chars = min(config.SUMMARY_CHUNK_CHARS, max_chars)
+    focus_line = f"Pay special attention to: {focus}\n" if focus else ""
+
+    chunks = split_text(text, chunk_chars, config.SUMMARY_CHUNK_OVERLAP)
+    print(f"Condensing {len(text)} characters in {len(chunks)} chunks")
+    summaries = _summarize_all(llm, [
+        (
+            f"This is part {i+1} of {len(chunks)} of a longer text. Summarize it as detailed bullet-point notes, "
+            "keeping every key fact, concept, number, name and decision. Do not add anything that is not in the text.\n"
+            f"{focus_line}\n--- BEGIN PART ---\n{chunk}\n--- END PART ---"
+        )
+        for i, chunk in enumerate(chunks)
+    ], config)
+
+    level = 1
+    while sum(len(summary) for summary in summaries) > max_chars and level < MAX_REDUCE_LEVELS:
+        # pack neighbouring summaries into groups that fit in one merge request.
+        groups: List[List[str]] = [[]]
+        for summary in summaries:
+            if groups[-1] and sum(len(s) for s in groups[-1]) + len(summary) > chunk_chars:
+                groups.append([])
+            groups[-1].append(summary)
+
+        if len(groups) == len(summaries):
+            # every summary is too big to pair up with another one, merge them two by two so we still make progress.
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+
+        level += 1
+        print(f"Merging {len(summaries)} partial summaries into {len(groups)} (level {level})")
+        summaries = _summarize_all(llm, [
+            (
+                "Merge the following consecutive partial summaries of one text into a single set of bullet-point notes. "
+                "Keep every key fact, number, name and decision, drop only repetition.\n"
+                f"{focus_line}\n" + "\n\n---\n\n".join(group)
+            )
+            for group in groups
+        ], config)
+
+    # the model kept its merges too long, cut what is left rather than overflowing the final request.
+    return "\n\n".join(summaries)[:max_chars]
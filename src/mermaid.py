@@ -1,7 +1,7 @@
 # src/flowchart.py
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from .config import Config
+from .llm_pool import get_chat_model
 import streamlit as st
 import streamlit.components.v1 as components
 import os
@@ -12,12 +12,7 @@ def generate_mermaid_flowchart(process_description: str) -> str:
         cfg = Config()
         
         # Use the model from config
-        llm = ChatGoogleGenerativeAI(
-            model=cfg.CHAT_MODEL,  # Get from your config
-            google_api_key=cfg.GEMINI_API_KEY,
-            temperature=0.3,
-            transport="rest"
-        )
+        llm = get_chat_model(cfg.CHAT_MODEL, temperature=0.3, transport="rest")
         
         # Simple and direct prompt
         system_prompt = """You are an expert at creating Mermaid flowchart diagrams. 
@@ -104,12 +99,7 @@ def troubleshoot_with_gemini(error_msg: str, original_description: str) -> str:
     """Use Gemini to help troubleshoot flowchart generation issues"""
     try:
         cfg = Config()
-        llm = ChatGoogleGenerativeAI(
-            model=cfg.CHAT_MODEL,
-            google_api_key=cfg.GEMINI_API_KEY,
-            temperature=0.7,
-            transport="rest"
-        )
+        llm = get_chat_model(cfg.CHAT_MODEL, temperature=0.7, transport="rest")
         
         troubleshoot_prompt = f"""I'm having trouble generating a Mermaid flowchart. Here's the error and context:
 
@@ -1,11 +1,14 @@
 # import google.generativeai as genai
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_community.document_loaders import UnstructuredPDFLoader
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from .config import Config
+from .llm_pool import get_chat_model
+from .ratelimit import request_priority
+from .image_cache import get_image_cache
+from .ingest_cache import get_ingest_cache, hash_file
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional, Tuple
 
 # converting base64 to pass to the vision model.
 import base64
@@ -14,94 +17,259 @@ import base64
 from PIL import Image
 import io
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import multiprocessing
+import os
+import threading
+
+IMAGE_ANALYSIS_PROMPT = """Analyze this image and provide a detailed description. Include:
+            1. What the image shows (objects, people, scenes, etc.)
+            2. Any text visible in the image
+            3. Important details that might be relevant for document understanding
+            4. If it's a chart, graph, or table, describe the data it contains
+
+            Provide a comprehensive description that contains all the values, data and key findings from the image.
+            """
+
+IMAGE_ANALYSIS_FAILED = "Image could not be analyzed for image description."
+
+def partition_pdf(pdf_path: str, chunk_size: int, chunk_overlap: int, progress: Optional[Callable[[str, int, int], None]] = None) -> List[Dict[str, Any]]:
+    """
+    The hi_res layout pass on its own: elements with text, table html and raw images, no image descriptions yet.
+    it only needs plain arguments and returns plain dicts, so it can run in a worker process (see process_pdfs).
+    """
+    loader = UnstructuredPDFLoader(
+            file_path=pdf_path,
+            strategy="hi_res",  # High resolution for better image/table extraction
+            infer_table_structure=True,  # Extract table structure
+            extract_images_in_pdf=True,  # Extract images
+            extract_image_block_types=["Image", "Table"],  # Extract both images and tables as images
+            chunking_strategy="by_title",  # Chunk by document structure
+            max_characters=chunk_size,
+            overlap=chunk_overlap
+            )
+    elements = loader.lazy_load()
+
+    # making a list that will have dictuionaries i.e. key value pairs in it. 
+    # this would not be much usefull but as we are adding image_description as well we could just make this new list with all the stuff we need from the extracted data.
+    processed_elements = []
+
+    pages_seen = set()
+
+    for i, element in enumerate(elements):
+        page_number = element.metadata.get("page_number")
+        if progress and page_number not in pages_seen:
+            pages_seen.add(page_number)
+            progress("pages", len(pages_seen), 0)
+        processed_element = {
+                "id": f"element_{i}",
+                # "type": doc.metadata.get("category", "unknown") get is used to retrive value of associated keys.
+                "type": element.metadata.get("category", "unknown"),
+                "content": str(element.page_content),
+                "metadata": element.metadata,
+                "source": pdf_path
+                }
+
+        if element.metadata.get("category") == "Table":
+            # storing the html_content 
+            # checking if there is text_as_html attribute.
+            # use dict["key"] when you are certain that key exist and want an error if it doesn't while using the get() allows you to enter a default value.
+            if "text_as_html" in element.metadata and element.metadata["text_as_html"]:
+                processed_element["html_content"] = element.metadata.get("text_as_html")
+                # no real value... just use type.
+            processed_element["content_type"] = "table"
+        elif element.metadata.get("category") == "Image":
+            processed_element["content_type"] = "image"
+
+            if "image_base64" in element.metadata and element.metadata["image_base64"]:
+                image_as_base64 = element.metadata.get("image_base64")
+                # kida not usefull but let it be for the safer side ig.
+                if image_as_base64:
+                    processed_element["image_data"] = image_as_base64
+                    # processed_element["content_type"] = "image"
+
+        else:
+                # regular text
+                processed_element["content_type"] = "text"
+
+        processed_elements.append(processed_element)
+
+    if progress:
+        progress("pages", len(pages_seen), len(pages_seen))
+    return processed_elements
+
+
 # this is a python class that will have instances with atributes like config.
 class PDF_processor:
     def __init__(self):
         self.config = Config()
 
-        self.vision_model = ChatGoogleGenerativeAI(
-                model=self.config.VISION_MODEL,  # e.g., "gemini-1.5-flash", "gemini-pro-vision"
-                api_key=self.config.GEMINI_API_KEY,
-                temperature=0.7,  # Optional: adjust as needed
-                max_tokens=None,  # Optional: set token limit
-                timeout=None,     # Optional: set timeout
-                max_retries=2,    # Optional: set retry attempts
-                )
+        # shared with every other processor in the process, see llm_pool
+        self.vision_model = get_chat_model(self.config.VISION_MODEL, temperature=0.7)
 
 
 # this function uses typing library to use uppercase annotations like List and not list eventhough you could probolbally use lowercase stff as well.
-    def process_pdf(self, pdf_path: str) -> List[ Dict[str, Any] ]:
+    def process_pdf(self, pdf_path: str, progress: Optional[Callable[[str, int, int], None]] = None) -> List[ Dict[str, Any] ]:
         """
         this is suppose to extract images, tables and text from pdf
+        `progress(stage, done, total)` is called with "pages" as pages come out of the layout pass
+        and with "images" as image descriptions finish, total is 0 while it is not known yet.
         """
         # using the try block so that if an error occur the program doesn't crashes and instead we could handle the error.
         try:
-            loader = UnstructuredPDFLoader(
-                    file_path=pdf_path,
-                    strategy="hi_res",  # High resolution for better image/table extraction
-                    infer_table_structure=True,  # Extract table structure
-                    extract_images_in_pdf=True,  # Extract images
-                    extract_image_block_types=["Image", "Table"],  # Extract both images and tables as images
-                    chunking_strategy="by_title",  # Chunk by document structure
-                    max_characters=self.config.CHUNK_SIZE,
-                    overlap=self.config.CHUNK_OVERLAP
-                    )
-            elements = loader.lazy_load()
-
-            # making a list that will have dictuionaries i.e. key value pairs in it. 
-            # this would not be much usefull but as we are adding image_description as well we could just make this new list with all the stuff we need from the extracted data.
-            processed_elements = []
-
-            for i, element in enumerate(elements):
-                processed_element = {
-                        "id": f"element_{i}",
-                        # "type": doc.metadata.get("category", "unknown") get is used to retrive value of associated keys.
-                        "type": element.metadata.get("category", "unknown"),
-                        "content": str(element.page_content),
-                        "metadata": element.metadata,
-                        "source": pdf_path
-                        }
-
-                if element.metadata.get("category") == "Table":
-                    # storing the html_content 
-                    # checking if there is text_as_html attribute.
-                    # use dict["key"] when you are certain that key exist and want an error if it doesn't while using the get() allows you to enter a default value.
-                    if "text_as_html" in element.metadata and element.metadata["text_as_html"]:
-                        processed_element["html_content"] = element.metadata.get("text_as_html")
-                        # no real value... just use type.
-                    processed_element["content_type"] = "table"
-                elif element.metadata.get("category") == "Image":
-                    processed_element["content_type"] = "image"
-
-                    if "image_base64" in element.metadata and element.metadata["image_base64"]:
-                        image_as_base64 = element.metadata.get("image_base64")
-                        # kida not usefull but let it be for the safer side ig.
-                        if image_as_base64:
-                            processed_element["image_data"] = image_as_base64
-                            # processed_element["content_type"] = "image"
-
-                            # using gimini vision to get a summry of image and storing it in.
-                            image_desc = self._analyze_image(image_as_base64)
-                            processed_element["image_desc"] = image_desc
-                            processed_element["content"] = f"Image: {image_desc}"
-
-                else:
-                        # regular text
-                        processed_element["content_type"] = "text"
-
-                processed_elements.append(processed_element)
-
-            return processed_elements
+            # the exact same file with the same chunking config was already processed, skip the hi_res pass.
+            cache_key, cached_elements = self._cached_elements(pdf_path)
+            if cached_elements is not None:
+                if progress:
+                    pages = {el["metadata"].get("page_number") for el in cached_elements}
+                    progress("pages", len(pages), len(pages))
+                return cached_elements
+
+            processed_elements = partition_pdf(pdf_path, self.config.CHUNK_SIZE, self.config.CHUNK_OVERLAP, progress)
+            return self._finish_elements(pdf_path, processed_elements, cache_key, progress)
 
         except Exception as shit:
             raise Exception(f"I guess i am an illiterate coz i cant read {pdf_path}: {str(shit)}")
 
+    def process_pdfs(self, pdf_paths: List[str], progress: Optional[Callable[[str, int, int], None]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """
+        Multi file version of process_pdf.
+        the hi_res layout passes run in the layout process pool, one file per core, so they don't share one cpu.
+        images are described here in the main process (they only wait on the api) as soon as a file's layout is done,
+        while the other files are still being laid out. files in the ingest cache never reach the pool.
+        returns the elements of all files merged in input order, plus {path: error} for files that failed.
+        `progress` gets "files" as files finish, "pages" as their layout is done and "images" summed over all files.
+        """
+        results: Dict[int, List[Dict[str, Any]]] = {}
+        failures: Dict[str, str] = {}
+        cache_keys: Dict[int, str] = {}
+        for i, pdf_path in enumerate(pdf_paths):
+            try:
+                cache_key, cached_elements = self._cached_elements(pdf_path)
+            except Exception as e:
+                failures[pdf_path] = str(e)
+                continue
+            if cached_elements is not None:
+                results[i] = cached_elements
+            else:
+                cache_keys[i] = cache_key
+
+        # counts per file, the callback gets the sums over every file.
+        file_pages: Dict[int, int] = {}
+        file_images: Dict[int, Tuple[int, int]] = {}
+
+        def files_done():
+            if progress:
+                progress("files", len(results) + len(failures), len(pdf_paths))
+
+        def pages_done(i: int, elements: List[Dict[str, Any]]):
+            file_pages[i] = len({el["metadata"].get("page_number") for el in elements})
+            if progress:
+                progress("pages", sum(file_pages.values()), sum(file_pages.values()))
+
+        def file_progress(i: int):
+            def report(stage: str, done: int, total: int):
+                if stage == "images":
+                    file_images[i] = (done, total)
+                    done = sum(counts[0] for counts in file_images.values())
+                    total = sum(counts[1] for counts in file_images.values())
+                if progress:
+                    progress(stage, done, total)
+            return report
+
+        for i, elements in results.items():
+            pages_done(i, elements)
+        files_done()
+        if cache_keys:
+            pool = get_layout_pool()
+            futures = {
+                pool.submit(partition_pdf, pdf_paths[i], self.config.CHUNK_SIZE, self.config.CHUNK_OVERLAP): i
+                for i in cache_keys
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    elements = future.result()
+                    pages_done(i, elements)
+                    results[i] = self._finish_elements(pdf_paths[i], elements, cache_keys[i], file_progress(i))
+                except Exception as e:
+                    print(f"I guess i am an illiterate coz i cant read {pdf_paths[i]}: {str(e)}")
+                    failures[pdf_paths[i]] = str(e)
+                files_done()
+
+        merged = []
+        for i in range(len(pdf_paths)):
+            merged.extend(results.get(i, []))
+        return merged, failures
+
+    def _cached_elements(self, pdf_path: str) -> Tuple[str, Optional[List[Dict[str, Any]]]]:
+        """ingest cache key of the file and its cached elements, None when it wasn't processed before"""
+        ingest_cache = get_ingest_cache()
+        cache_key = ingest_cache.make_key(hash_file(pdf_path), self.config)
+        cached_elements = ingest_cache.get(cache_key)
+        if cached_elements is not None:
+            for element in cached_elements:
+                # the file could have been saved under a different temp name this time.
+                element["source"] = pdf_path
+                element["metadata"]["source"] = pdf_path
+        return cache_key, cached_elements
+
+    def _finish_elements(self, pdf_path: str, processed_elements: List[Dict[str, Any]], cache_key: str,
+                         progress: Optional[Callable[[str, int, int], None]] = None) -> List[Dict[str, Any]]:
+        """describe the images of a laid out file and cache the result"""
+        # using gimini vision to get a summry of every image and storing it in.
+        pending_images = [el for el in processed_elements if el.get("image_data")]
+        self._describe_images(pending_images, progress)
+
+        # don't cache a run where some image failed, it should get another try next time.
+        if all(el.get("image_desc") != IMAGE_ANALYSIS_FAILED for el in pending_images):
+            try:
+                get_ingest_cache().put(cache_key, processed_elements)
+            except Exception as e:
+                print(f"Could not cache processed elements for {pdf_path}: {e}")
+
+        return processed_elements
+
+
+    def _analyze_image_in_background(self, image_data):
+        # pool threads don't inherit the context, so set the priority here. a chat question goes first.
+        with request_priority("background"):
+            return self._analyze_image(image_data)
+
+    def _describe_images(self, image_elements: List[Dict[str, Any]], progress: Optional[Callable[[str, int, int], None]] = None):
+        """
+        runs _analyze_image for all the images using a bounded thread pool.
+        the elements are updated in place so the original element order is kept.
+        """
+        if progress:
+            progress("images", 0, len(image_elements))
+        if not image_elements:
+            return
+
+        workers = max(1, min(self.config.IMAGE_ANALYSIS_WORKERS, len(image_elements)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # map returns results in the same order as the input.
+            descriptions = pool.map(self._analyze_image_in_background, [el["image_data"] for el in image_elements])
+            for done, (element, image_desc) in enumerate(zip(image_elements, descriptions), start=1):
+                element["image_desc"] = image_desc
+                element["content"] = f"Image: {image_desc}"
+                if progress:
+                    progress("images", done, len(image_elements))
+
 
     def _analyze_image(self, image_base64: str) -> str:
         """ gets a summary and tries to analyze the image """
         try:
             # decode the image from base64.
             image_data = base64.b64decode(image_base64)
+
+            # same image bytes + same prompt + same model means the same description, so check the cache first.
+            cache = get_image_cache()
+            cache_key = cache.make_key(image_data, IMAGE_ANALYSIS_PROMPT, self.config.VISION_MODEL)
+            cached_desc = cache.get(cache_key)
+            if cached_desc is not None:
+                return cached_desc
+
             # ByteIO is used for in in memory data stream.
             image = Image.open(io.BytesIO(image_data))
 
@@ -112,15 +280,7 @@ class PDF_processor:
             if image.size[0] > self.config.MAX_IMAGE_SIZE[0] or image.size[1] > self.config.MAX_IMAGE_SIZE[1]:
                 image.thumbnail(self.config.MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
 
-            prompt = """Analyze this image and provide a detailed description. Include:
-            1. What the image shows (objects, people, scenes, etc.)
-            2. Any text visible in the image
-            3. Important details that might be relevant for document understanding
-            4. If it's a chart, graph, or table, describe the data it contains
-
-            Provide a comprehensive description that contains all the values, data and key findings from the image.
-            """
-
+            prompt = IMAGE_ANALYSIS_PROMPT
 
             messages = [ HumanMessage( 
                                       content = [
@@ -141,11 +301,13 @@ class PDF_processor:
                         SystemMessage("you are an image analyzing assistant, analyze all images with atmost accuracy to retrive all information from it.")
                         ]
 
-            # generating a response.
-            respo = self.vision_model.invoke([messages])
+            # generating a response, the pooled model waits on the shared vision bucket first.
+            respo = self.vision_model.invoke(messages)
 
 
-            if isinstance(respo, str):
+            if isinstance(respo.content, str):
+                # only real descriptions are cached, errors should be retried next time.
+                cache.put(cache_key, respo.content)
                 return respo.content
             else:
                 raise ValueError("Expected a string in respo.content, got: {}".format(type(respo.content)))
@@ -154,21 +316,34 @@ class PDF_processor:
 
         except Exception as e:
             print(f"Error analyzing image with Gemini: {str(e)}")
-            return "Image could not be analyzed for image description."
-
-
-
-
-
-
-
-
-
+            return IMAGE_ANALYSIS_FAILED
 
 
+_pdf_processor = None  # lazy singleton
+_pdf_processor_lock = threading.Lock()
 
 
+def get_pdf_processor() -> PDF_processor:
+    """Get the process wide PDF processor, it holds no per document state so every session can share it"""
+    global _pdf_processor
+    with _pdf_processor_lock:
+        if _pdf_processor is None:
+            _pdf_processor = PDF_processor()
+    return _pdf_processor
 
 
+_layout_pool = None  # lazy singleton
+_layout_pool_lock = threading.Lock()
 
 
+def get_layout_pool() -> ProcessPoolExecutor:
+    """
+    Process pool for the hi_res layout passes, one worker per core unless Config.LAYOUT_PROCESSES says otherwise.
+    workers are spawned rather than forked, forking the threaded streamlit server can deadlock the child.
+    """
+    global _layout_pool
+    with _layout_pool_lock:
+        if _layout_pool is None:
+            workers = Config().LAYOUT_PROCESSES or os.cpu_count() or 1
+            _layout_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _layout_pool
@@ -1,29 +1,68 @@
 # src/quiz.py
 from pathlib import Path
 from typing import List, Dict, Any, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from .config import Config
-from .pdf_processor import PDF_processor
-from .vectors import add_documents, query
+from .llm_pool import get_chat_model
+from .quiz_bank import get_quiz_bank, fill_bank_in_background
+from .session import get_session_upload_dir
+from .ingest_cache import hash_file
+from .keyword_index import KeywordIndex
 import os
 import json
 import random
 import re
+import threading
+import time
+
+# the mix of questions in every quiz, in the order they are shown.
+QUESTION_TYPES = ["multiple_choice", "multiple_choice", "true_false", "fill_blank", "short_answer"]
+
+QUESTION_TYPE_NAMES = {
+    "multiple_choice": "multiple choice question with 4 options",
+    "true_false": "true/false statement",
+    "fill_blank": "fill-in-the-blank sentence",
+    "short_answer": "short answer question needing a 1-2 sentence answer",
+}
+
+FALLBACK_TOPICS = ["General Content", "Key Concepts", "Main Ideas"]
+
+QUIZ_MODES = {
+    "parallel": "Parallel (one request per question)",
+    "single": "Single request (all questions at once)",
+}
 
 class QuizGenerator:
     def __init__(self):
         self.config = Config()
-        self.pdf_processor = PDF_processor()
-        self.llm = ChatGoogleGenerativeAI(
-            model=self.config.CHAT_MODEL_BEST,
-            temperature=0.3,  # Lower temperature for more consistent JSON
-            google_api_key=self.config.GEMINI_API_KEY,
-            transport="rest"
-        )
+        # Lower temperature for more consistent JSON
+        self.llm = get_chat_model(self.config.CHAT_MODEL_BEST, temperature=0.3, transport="rest")
+        # per document keyword indexes for picking topic content, see _get_element_index
+        self._element_indexes: Dict[int, Any] = {}
+        self._element_index_lock = threading.Lock()
     
-    def extract_topics_from_pdf(self, pdf_elements: List[Dict[str, Any]]) -> List[str]:
-        """Extract main topics from processed PDF elements"""
+    @property
+    def pdf_processor(self):
+        # imported on first upload, not when the quiz tab opens. unstructured and PIL take a while to load.
+        from .pdf_processor import get_pdf_processor
+        return get_pdf_processor()
+    
+    def extract_topics_from_pdf(self, pdf_elements: List[Dict[str, Any]], doc_hash: Optional[str] = None) -> List[str]:
+        """
+        Extract main topics from processed PDF elements.
+        with a doc_hash the topics are kept in the quiz bank and questions for all of them
+        start generating in the background, so later quizzes can be served straight from the bank.
+        """
+        if doc_hash:
+            topics = get_quiz_bank().get_topics(doc_hash) or self._extract_topics(pdf_elements)
+            if topics != FALLBACK_TOPICS:
+                get_quiz_bank().set_topics(doc_hash, topics)
+                fill_bank_in_background(self, doc_hash, topics, pdf_elements)
+            return topics
+        return self._extract_topics(pdf_elements)
+    
+    def _extract_topics(self, pdf_elements: List[Dict[str, Any]]) -> List[str]:
+        """Ask the llm for the main topics of the document"""
         try:
             # Combine all text content
             all_text = ""
@@ -73,10 +112,15 @@ class QuizGenerator:
             
         except Exception as e:
             print(f"Error extracting topics: {str(e)}")
-            return ["General Content", "Key Concepts", "Main Ideas"]
+            return list(FALLBACK_TOPICS)
     
-    def generate_quiz_questions(self, topic: str, pdf_elements: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Generate 5 mixed-type questions on a specific topic"""
+    def generate_quiz_questions(self, topic: str, pdf_elements: List[Dict[str, Any]], mode: str = "parallel") -> Dict[str, Any]:
+        """
+        Generate 5 mixed-type questions on a specific topic.
+        mode "parallel" sends one request per question all at once, mode "single" asks for all 5 in one structured request.
+        the result also carries the end to end latency so the ui can compare the two.
+        """
+        started = time.perf_counter()
         try:
             # Find relevant content for the topic
             topic_content = self._get_topic_relevant_content(topic, pdf_elements)
@@ -84,96 +128,147 @@ class QuizGenerator:
             if not topic_content:
                 topic_content = "No specific content found for this topic."
             
-            # Use a simpler approach - generate one question at a time
-            questions = []
-            question_types = ["multiple_choice", "multiple_choice", "true_false", "fill_blank", "short_answer"]
-            
-            for i, q_type in enumerate(question_types):
-                question = self._generate_single_question(topic, topic_content, q_type, i+1)
-                if question:
-                    questions.append(question)
+            if mode == "single":
+                questions = self._generate_questions_single_request(topic, topic_content, QUESTION_TYPES)
+            else:
+                questions = self._generate_questions_parallel(topic, topic_content, QUESTION_TYPES)
             
-            return {"questions": questions}
+            quiz = {"questions": questions}
                 
         except Exception as e:
             print(f"Error generating questions: {str(e)}")
-            return self._create_fallback_questions(topic, pdf_elements)
+            quiz = self._create_fallback_questions(topic, pdf_elements)
+
+        quiz["mode"] = mode
+        quiz["latency"] = time.perf_counter() - started
+        return quiz
+
+    def _generate_questions_parallel(self, topic: str, content: str, question_types: List[str]) -> List[Dict[str, Any]]:
+        """one request per question type, all in flight together. order is kept and failed ones are just left out"""
+        prompts = [self._question_prompt(topic, content, q_type) for q_type in question_types]
+        results = self.llm.batch(
+            prompts,
+            config={"max_concurrency": self.config.QUIZ_MAX_CONCURRENCY},
+            return_exceptions=True,
+        )
+
+        questions = []
+        for q_type, result in zip(question_types, results):
+            if isinstance(result, Exception):
+                print(f"Error generating {q_type} question: {str(result)}")
+                continue
+            question = self._parse_question_response(result.content.strip(), q_type)
+            if question:
+                questions.append(question)
+        return questions
+
+    def _generate_questions_single_request(self, topic: str, content: str, question_types: List[str]) -> List[Dict[str, Any]]:
+        """all the questions from one structured request, cheaper on quota but one slow request"""
+        type_list = "\n".join(f"{i+1}. {QUESTION_TYPE_NAMES[q_type]}" for i, q_type in enumerate(question_types))
+        prompt = f"""
+        Based on the following content about "{topic}", create {len(question_types)} quiz questions, in this order:
+        {type_list}
+        
+        Content: {content[:3000]}
+        
+        Separate the questions with a line containing only "---".
+        For every question respond in this exact format:
+        TYPE: [multiple_choice, true_false, fill_blank or short_answer]
+        QUESTION: [Your question, statement, or sentence with ______ for the missing part]
+        A) [First option]
+        B) [Second option]
+        C) [Third option]
+        D) [Fourth option]
+        CORRECT: [A, B, C or D / True or False / the missing word or phrase / a good 1-2 sentence answer]
+        EXPLANATION: [Why the answer is correct]
+        REVIEW: [What section to review if wrong]
+        
+        Only multiple_choice questions have the A) to D) option lines.
+        """
+        
+        result = self.llm.invoke(prompt)
+        
+        questions = []
+        for i, block in enumerate(re.split(r"^\s*---+\s*$", result.content.strip(), flags=re.MULTILINE)):
+            if not block.strip():
+                continue
+            type_match = re.search(r"^\s*TYPE:\s*(\w+)", block, flags=re.MULTILINE)
+            q_type = type_match.group(1).strip().lower() if type_match else None
+            if q_type not in QUESTION_TYPE_NAMES:
+                # fall back to the type we asked for at this position.
+                q_type = question_types[min(len(questions), len(question_types) - 1)]
+            question = self._parse_question_response(block, q_type)
+            if question and question["question"]:
+                questions.append(question)
+        return questions
     
-    def _generate_single_question(self, topic: str, content: str, question_type: str, question_num: int) -> Dict[str, Any]:
-        """Generate a single question of specified type"""
-        try:
-            if question_type == "multiple_choice":
-                prompt = f"""
-                Based on the following content about "{topic}", create 1 multiple choice question.
-                
-                Content: {content[:3000]}
-                
-                Create a question with 4 realistic options where only one is correct.
-                
-                Respond in this exact format:
-                QUESTION: [Your question here]
-                A) [First option]
-                B) [Second option] 
-                C) [Third option]
-                D) [Fourth option]
-                CORRECT: [A, B, C, or D]
-                EXPLANATION: [Why the answer is correct]
-                REVIEW: [What section to review if wrong]
-                """
-            
-            elif question_type == "true_false":
-                prompt = f"""
-                Based on the following content about "{topic}", create 1 true/false question.
-                
-                Content: {content[:3000]}
-                
-                Create a statement that is either clearly true or clearly false based on the content.
-                
-                Respond in this exact format:
-                QUESTION: [Your statement here]
-                CORRECT: [True or False]
-                EXPLANATION: [Why this is the correct answer]
-                REVIEW: [What section to review if wrong]
-                """
-            
-            elif question_type == "fill_blank":
-                prompt = f"""
-                Based on the following content about "{topic}", create 1 fill-in-the-blank question.
-                
-                Content: {content[:3000]}
-                
-                Create a sentence with one important word or phrase replaced with "______".
-                
-                Respond in this exact format:
-                QUESTION: [Your sentence with ______ for the missing part]
-                CORRECT: [The word/phrase that goes in the blank]
-                EXPLANATION: [Why this is the correct answer]
-                REVIEW: [What section to review if wrong]
-                """
-            
-            else:  # short_answer
-                prompt = f"""
-                Based on the following content about "{topic}", create 1 short answer question.
-                
-                Content: {content[:3000]}
-                
-                Create a question that requires a 1-2 sentence answer.
-                
-                Respond in this exact format:
-                QUESTION: [Your question here]
-                CORRECT: [A good 1-2 sentence answer]
-                EXPLANATION: [Additional explanation]
-                REVIEW: [What section to review if wrong]
-                """
+    def _question_prompt(self, topic: str, content: str, question_type: str) -> str:
+        """Prompt asking for one question of the given type"""
+        if question_type == "multiple_choice":
+            prompt = f"""
+            Based on the following content about "{topic}", create 1 multiple choice question.
             
-            result = self.llm.invoke(prompt)
-            response = result.content.strip()
+            Content: {content[:3000]}
             
-            return self._parse_question_response(response, question_type)
+            Create a question with 4 realistic options where only one is correct.
             
-        except Exception as e:
-            print(f"Error generating {question_type} question: {str(e)}")
-            return None
+            Respond in this exact format:
+            QUESTION: [Your question here]
+            A) [First option]
+            B) [Second option] 
+            C) [Third option]
+            D) [Fourth option]
+            CORRECT: [A, B, C, or D]
+            EXPLANATION: [Why the answer is correct]
+            REVIEW: [What section to review if wrong]
+            """
+        
+        elif question_type == "true_false":
+            prompt = f"""
+            Based on the following content about "{topic}", create 1 true/false question.
+            
+            Content: {content[:3000]}
+            
+            Create a statement that is either clearly true or clearly false based on the content.
+            
+            Respond in this exact format:
+            QUESTION: [Your statement here]
+            CORRECT: [True or False]
+            EXPLANATION: [Why this is the correct answer]
+            REVIEW: [What section to review if wrong]
+            """
+        
+        elif question_type == "fill_blank":
+            prompt = f"""
+            Based on the following content about "{topic}", create 1 fill-in-the-blank question.
+            
+            Content: {content[:3000]}
+            
+            Create a sentence with one important word or phrase replaced with "______".
+            
+            Respond in this exact format:
+            QUESTION: [Your sentence with ______ for the missing part]
+            CORRECT: [The word/phrase that goes in the blank]
+            EXPLANATION: [Why this is the correct answer]
+            REVIEW: [What section to review if wrong]
+            """
+        
+        else:  # short_answer
+            prompt = f"""
+            Based on the following content about "{topic}", create 1 short answer question.
+            
+            Content: {content[:3000]}
+            
+            Create a question that requires a 1-2 sentence answer.
+            
+            Respond in this exact format:
+            QUESTION: [Your question here]
+            CORRECT: [A good 1-2 sentence answer]
+            EXPLANATION: [Additional explanation]
+            REVIEW: [What section to review if wrong]
+            """
+        
+        return prompt
     
     def _parse_question_response(self, response: str, question_type: str) -> Dict[str, Any]:
         """Parse the LLM response into a structured question"""
@@ -215,29 +310,51 @@ class QuizGenerator:
             print(f"Error parsing question response: {str(e)}")
             return None
     
+    def _element_text(self, element: Dict[str, Any]) -> str:
+        """how an element shows up in the quiz context, empty for elements with nothing to quiz on"""
+        content = element.get("content", "")
+        if element.get("content_type") == "text":
+            return content
+        elif element.get("content_type") == "table":
+            return f"Table: {content}"
+        elif element.get("content_type") == "image" and element.get("image_desc"):
+            return f"Image: {element['image_desc']}"
+        return ""
+    
+    def _get_element_index(self, pdf_elements: List[Dict[str, Any]]) -> KeywordIndex:
+        """
+        bm25 index over the elements of one document, built once and reused for every topic.
+        the element list is kept alongside the index so a recycled id() can never match another list.
+        """
+        with self._element_index_lock:
+            key = id(pdf_elements)
+            cached = self._element_indexes.pop(key, None)
+            if cached is None or cached[0] is not pdf_elements:
+                index = KeywordIndex()
+                positions = [i for i, element in enumerate(pdf_elements) if self._element_text(element)]
+                index.add([str(i) for i in positions], [self._element_text(pdf_elements[i]) for i in positions])
+                cached = (pdf_elements, index)
+            # most recently used last, only a few documents are kept around.
+            self._element_indexes[key] = cached
+            while len(self._element_indexes) > 4:
+                self._element_indexes.pop(next(iter(self._element_indexes)))
+            return cached[1]
+    
     def _get_topic_relevant_content(self, topic: str, pdf_elements: List[Dict[str, Any]]) -> str:
-        """Extract content relevant to the specific topic"""
+        """Extract content relevant to the specific topic, most relevant elements first"""
         relevant_content = ""
-        topic_lower = topic.lower()
         
-        for element in pdf_elements:
-            content = element.get("content", "")
-            if any(word in content.lower() for word in topic_lower.split()):
-                if element.get("content_type") == "text":
-                    relevant_content += content + "\n"
-                elif element.get("content_type") == "table":
-                    relevant_content += f"Table: {content}\n"
-                elif element.get("content_type") == "image" and element.get("image_desc"):
-                    relevant_content += f"Image: {element['image_desc']}\n"
+        index = self._get_element_index(pdf_elements)
+        for element_id, _ in index.search(topic, k=50):
+            if len(relevant_content) > 6000:
+                break
+            relevant_content += self._element_text(pdf_elements[int(element_id)]) + "\n"
         
         # If no specific content found, use general content
         if not relevant_content.strip():
             for element in pdf_elements[:5]:  # Use first 5 elements as general content
-                content = element.get("content", "")
-                if element.get("content_type") == "text":
-                    relevant_content += content + "\n"
-                elif element.get("content_type") == "table":
-                    relevant_content += f"Table: {content}\n"
+                if element.get("content_type") in ("text", "table"):
+                    relevant_content += self._element_text(element) + "\n"
         
         # Limit content length
         if len(relevant_content) > 6000:
@@ -254,6 +371,8 @@ class QuizGenerator:
                 content_sample += element["content"][:200] + " "
         
         return {
+            # generic questions, these never go into the quiz bank.
+            "fallback": True,
             "questions": [
                 {
                     "type": "multiple_choice",
@@ -328,18 +447,20 @@ def render_quiz_ui():
             with st.spinner("Processing PDF and extracting topics..."):
                 try:
                     # Save uploaded file temporarily
-                    temp_path = f"temp_quiz_{uploaded_file.name}"
+                    temp_path = os.path.join(get_session_upload_dir(), f"temp_quiz_{Path(uploaded_file.name).name}")
                     with open(temp_path, "wb") as f:
                         f.write(uploaded_file.getbuffer())
                     
                     # Process PDF using existing pipeline
                     pdf_elements = st.session_state.quiz_generator.pdf_processor.process_pdf(temp_path)
+                    doc_hash = hash_file(temp_path)
                     
-                    # Extract topics
-                    topics = st.session_state.quiz_generator.extract_topics_from_pdf(pdf_elements)
+                    # Extract topics, this also starts filling the question bank in the background
+                    topics = st.session_state.quiz_generator.extract_topics_from_pdf(pdf_elements, doc_hash=doc_hash)
                     
                     # Store in session state
                     st.session_state.pdf_elements = pdf_elements
+                    st.session_state.quiz_doc_hash = doc_hash
                     st.session_state.quiz_topics = topics
                     st.session_state.pdf_processed = True
                     
@@ -365,12 +486,44 @@ def render_quiz_ui():
                 help="Choose the topic you want to be quizzed on"
             )
             
+            # once the bank holds a whole quiz for this topic it is served from there, no generation happens
+            doc_hash = st.session_state.get('quiz_doc_hash')
+            from_bank = bool(doc_hash) and get_quiz_bank().question_count(doc_hash, selected_topic) >= len(QUESTION_TYPES)
+            
+            generation_mode = st.radio(
+                "Generation mode:",
+                list(QUIZ_MODES.keys()),
+                format_func=lambda m: QUIZ_MODES[m],
+                horizontal=True,
+                disabled=from_bank,
+                help="Parallel is usually faster, single request uses less quota"
+            )
+            if from_bank:
+                st.caption("Quizzes on this topic are served from the question bank, the generation mode is only used when it runs out.")
+            
             if st.button("Generate Quiz Questions", type="primary"):
                 with st.spinner("Generating quiz questions..."):
                     try:
-                        quiz_data = st.session_state.quiz_generator.generate_quiz_questions(
-                            selected_topic, st.session_state.pdf_elements
-                        )
+                        quiz_generator = st.session_state.quiz_generator
+                        doc_hash = st.session_state.get('quiz_doc_hash')
+                        bank = get_quiz_bank()
+                        
+                        # serve from the question bank when it has enough questions for this topic
+                        quiz_data = bank.sample(doc_hash, selected_topic, QUESTION_TYPES) if doc_hash else None
+                        if quiz_data is not None:
+                            st.caption("Served from the question bank")
+                        else:
+                            quiz_data = quiz_generator.generate_quiz_questions(
+                                selected_topic, st.session_state.pdf_elements, mode=generation_mode
+                            )
+                            # keep the latest latency of every mode so they can be compared
+                            st.session_state.setdefault('quiz_latency', {})[generation_mode] = quiz_data.get('latency', 0.0)
+                            if doc_hash and not quiz_data.get('fallback'):
+                                bank.add_questions(doc_hash, selected_topic, quiz_data.get('questions', []), served=1)
+                        
+                        # top the bank up in the background once it runs low on unseen questions
+                        if doc_hash and bank.unseen_count(doc_hash, selected_topic) < st.session_state.config.QUIZ_BANK_LOW_WATER:
+                            fill_bank_in_background(quiz_generator, doc_hash, [selected_topic], st.session_state.pdf_elements)
                         
                         st.session_state.quiz_data = quiz_data
                         st.session_state.selected_topic = selected_topic
@@ -391,6 +544,14 @@ def render_quiz_ui():
                         
                     except Exception as e:
                         st.error(f"Error generating quiz: {str(e)}")
+            
+            latencies = st.session_state.get('quiz_latency', {})
+            if latencies and not from_bank:
+                cols = st.columns(len(QUIZ_MODES))
+                for col, (mode, label) in zip(cols, QUIZ_MODES.items()):
+                    with col:
+                        value = f"{latencies[mode]:.1f}s" if mode in latencies else "-"
+                        st.metric(f"Latency: {label}", value)
         else:
             st.warning("No topics found. Try processing a different PDF.")
     
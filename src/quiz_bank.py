@@ -0,0 +1,166 @@
+# src/quiz_bank.py
+import json
+import math
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .config import Config
+from .ratelimit import request_priority
+
+
+class QuizBank:
+    """
+    Persistent question bank, one json file per document hash holding the topics and the questions per topic.
+    every question remembers how often it was served so quizzes prefer questions the user hasn't seen yet,
+    and the bank counts as low on a topic once there are not enough unseen questions left.
+    """
+
+    def __init__(self, bank_dir: str):
+        self.bank_dir = bank_dir
+        self.lock = threading.RLock()
+        self.banks: Dict[str, Dict[str, Any]] = {}
+        os.makedirs(bank_dir, exist_ok=True)
+
+    def _path(self, doc_hash: str) -> str:
+        return os.path.join(self.bank_dir, f"{doc_hash}.json")
+
+    def _load(self, doc_hash: str) -> Dict[str, Any]:
+        """bank for one document, read from disk the first time. caller holds the lock."""
+        if doc_hash not in self.banks:
+            bank = {"topics": [], "questions": {}}
+            try:
+                with open(self._path(doc_hash), "r", encoding="utf-8") as f:
+                    bank = json.load(f)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Could not read quiz bank {doc_hash}: {e}")
+            self.banks[doc_hash] = bank
+        return self.banks[doc_hash]
+
+    def _save(self, doc_hash: str):
+        path = self._path(doc_hash)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.banks[doc_hash], f)
+        os.replace(tmp_path, path)
+
+    def get_topics(self, doc_hash: str) -> List[str]:
+        with self.lock:
+            return list(self._load(doc_hash)["topics"])
+
+    def set_topics(self, doc_hash: str, topics: List[str]):
+        with self.lock:
+            self._load(doc_hash)["topics"] = list(topics)
+            self._save(doc_hash)
+
+    def add_questions(self, doc_hash: str, topic: str, questions: List[Dict[str, Any]], served: int = 0) -> int:
+        """
+        store new questions, `served` is 1 for questions that were just shown to the user.
+        returns how many were new, questions already in the bank are skipped.
+        """
+        with self.lock:
+            stored = self._load(doc_hash)["questions"].setdefault(topic, [])
+            known = {q["question"] for q in stored}
+            added = 0
+            for question in questions:
+                if question.get("question") and question["question"] not in known:
+                    known.add(question["question"])
+                    stored.append({**question, "served": served})
+                    added += 1
+            self._save(doc_hash)
+            return added
+
+    def question_count(self, doc_hash: str, topic: str) -> int:
+        with self.lock:
+            return len(self._load(doc_hash)["questions"].get(topic, []))
+
+    def unseen_count(self, doc_hash: str, topic: str) -> int:
+        with self.lock:
+            return sum(1 for q in self._load(doc_hash)["questions"].get(topic, []) if q["served"] == 0)
+
+    def sample(self, doc_hash: str, topic: str, question_types: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        pick one question per entry of question_types (least served first), falling back to any type
+        when a type has run out. returns None when the bank can't fill a whole quiz yet.
+        """
+        with self.lock:
+            stored = self._load(doc_hash)["questions"].get(topic, [])
+            if len(stored) < len(question_types):
+                return None
+
+            # shuffle first so questions served equally often come out in random order.
+            pool = random.sample(stored, len(stored))
+            pool.sort(key=lambda q: q["served"])
+
+            chosen = []
+            for q_type in question_types:
+                match = next((q for q in pool if q["type"] == q_type), None) or pool[0]
+                pool.remove(match)
+                chosen.append(match)
+
+            for question in chosen:
+                question["served"] += 1
+            self._save(doc_hash)
+
+            return {"questions": [{k: v for k, v in q.items() if k != "served"} for q in chosen]}
+
+
+_quiz_bank = None  # lazy singleton
+_quiz_bank_lock = threading.Lock()
+
+# background generation runs here, shared by every session.
+_fill_pool = None
+_filling = set()
+
+
+def get_quiz_bank() -> QuizBank:
+    """Get the process wide quiz bank, creating it lazily on first use"""
+    global _quiz_bank, _fill_pool
+    with _quiz_bank_lock:
+        if _quiz_bank is None:
+            cfg = Config()
+            _quiz_bank = QuizBank(os.path.join(cfg.CACHE_DIR, "quiz_bank"))
+            _fill_pool = ThreadPoolExecutor(max_workers=cfg.QUIZ_BANK_WORKERS, thread_name_prefix="quiz-bank")
+    return _quiz_bank
+
+
+def fill_bank_in_background(generator, doc_hash: str, topics: List[str], pdf_elements: List[Dict[str, Any]]):
+    """
+    Top up the bank for every topic without blocking the caller.
+    a topic already being filled is skipped so repeated clicks don't queue duplicate work.
+    """
+    bank = get_quiz_bank()
+    target = Config().QUIZ_BANK_TARGET
+
+    def fill(topic: str):
+        try:
+            from .quiz import QUESTION_TYPES
+            # every round adds up to one quiz worth of questions, one spare round for duplicates.
+            rounds = math.ceil(target / len(QUESTION_TYPES)) + 1
+            # nobody is waiting on this, so it queues behind chat and quiz requests.
+            with request_priority("background"):
+                for _ in range(rounds):
+                    if bank.unseen_count(doc_hash, topic) >= target:
+                        break
+                    quiz = generator.generate_quiz_questions(topic, pdf_elements)
+                    if quiz.get("fallback") or not quiz.get("questions"):
+                        break
+                    if not bank.add_questions(doc_hash, topic, quiz["questions"]):
+                        # the model keeps repeating itself on this topic, more rounds won't help
+                        break
+        except Exception as e:
+            print(f"Error filling quiz bank for {topic}: {e}")
+        finally:
+            with _quiz_bank_lock:
+                _filling.discard((doc_hash, topic))
+
+    for topic in topics:
+        with _quiz_bank_lock:
+            if (doc_hash, topic) in _filling:
+                continue
+            _filling.add((doc_hash, topic))
+        _fill_pool.submit(fill, topic)
@@ -0,0 +1,151 @@
+# src/ratelimit.py
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import Config
+
+# lower number goes first. interactive is a user waiting on the screen (chat, quiz on click),
+# background is work nobody is watching right now (image descriptions, quiz bank fill, batch jobs).
+PRIORITIES = {"interactive": 0, "background": 1}
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("request_priority", default="interactive")
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def request_priority(priority: str):
+    """
+    Run the block with this priority, every acquire() inside it (also through langchain) queues with it.
+    contextvars follow asyncio tasks and asyncio.to_thread, plain thread pools need to set it in the worker.
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority {priority}, expected one of {list(PRIORITIES)}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket with a priority queue in front of it.
+    refills `rate_per_minute` tokens per minute and holds at most `capacity` tokens (default 1),
+    so any 60 seconds see at most rate_per_minute + capacity requests.
+    waiting callers are served strictly by priority and then first come first served,
+    so an interactive request never waits behind a pile of background work.
+    """
+
+    def __init__(self, rate_per_minute: int, capacity: Optional[int] = None, name: str = ""):
+        self.name = name
+        self.rate_per_minute = max(1, rate_per_minute)
+        self.rate = self.rate_per_minute / 60.0  # tokens per second
+        # a full minute worth of capacity would let twice the quota through in the first minute
+        self.capacity = capacity or 1
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Condition()
+
+        # (priority, arrival) of every waiting caller, the head of the heap is next in line.
+        self.queue: List[Tuple[int, int]] = []
+        self.arrivals = itertools.count()
+        self.waiting = {priority: 0 for priority in PRIORITIES}
+        self.granted = {priority: 0 for priority in PRIORITIES}
+        self.wait_seconds = {priority: 0.0 for priority in PRIORITIES}
+        self.max_queue_depth = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _grant(self, tokens: int, priority: str, waited: float):
+        self.tokens -= tokens
+        self.granted[priority] += 1
+        self.wait_seconds[priority] += waited
+
+    def acquire(self, tokens: int = 1, blocking: bool = True, priority: Optional[str] = None) -> bool:
+        """take `tokens` from the bucket, waiting in line until they are available if blocking."""
+        priority = priority or current_priority()
+        started = time.monotonic()
+        with self.lock:
+            self._refill()
+            if not self.queue and self.tokens >= tokens:
+                self._grant(tokens, priority, 0.0)
+                return True
+            if not blocking:
+                return False
+
+            ticket = (PRIORITIES[priority], next(self.arrivals))
+            heapq.heappush(self.queue, ticket)
+            self.waiting[priority] += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self.queue))
+            try:
+                while True:
+                    self._refill()
+                    if self.queue[0] == ticket:
+                        if self.tokens >= tokens:
+                            heapq.heappop(self.queue)
+                            self._grant(tokens, priority, time.monotonic() - started)
+                            return True
+                        # head of the line, sleep until enough has refilled
+                        self.lock.wait((tokens - self.tokens) / self.rate)
+                    else:
+                        # someone else is first, we get woken up when the line moves
+                        self.lock.wait()
+            finally:
+                self.waiting[priority] -= 1
+                if ticket in self.queue:
+                    # only happens when the wait was interrupted
+                    self.queue.remove(ticket)
+                    heapq.heapify(self.queue)
+                self.lock.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            self._refill()
+            return {
+                "rate_per_minute": self.rate_per_minute,
+                "tokens_available": round(self.tokens, 2),
+                "queue_depth": len(self.queue),
+                "max_queue_depth": self.max_queue_depth,
+                "waiting": dict(self.waiting),
+                "granted": dict(self.granted),
+                "avg_wait_seconds": {
+                    priority: round(self.wait_seconds[priority] / self.granted[priority], 2) if self.granted[priority] else 0.0
+                    for priority in PRIORITIES
+                },
+            }
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str, rate_per_minute: Optional[int] = None) -> TokenBucket:
+    """
+    Get the process wide bucket for `name` (usually a model name).
+    every caller using the same name shares the same quota. the rate comes from
+    Config.MODEL_RATE_LIMITS for that model, or MAX_REQUESTS_PER_MINUTE.
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            cfg = Config()
+            rate = rate_per_minute or cfg.MODEL_RATE_LIMITS.get(name) or cfg.MAX_REQUESTS_PER_MINUTE
+            _limiters[name] = TokenBucket(rate, capacity=cfg.RATE_LIMIT_BURST, name=name)
+        return _limiters[name]
+
+
+def scheduler_stats() -> Dict[str, Dict[str, Any]]:
+    """queue depth, grants and waiting times per model, for the metrics panel"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
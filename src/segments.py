@@ -0,0 +1,45 @@
+# src/segments.py
+# planning and stitching of overlapping audio segments, kept apart from trans.py so it needs no deepgram or ffmpeg.
+
+
+def plan_segments(duration, segment_seconds, overlap_seconds):
+    """
+    (start, length) of every segment. each segment runs overlap_seconds into the next one
+    so a word cut at the edge of one segment is heard whole by its neighbour.
+    """
+    segments = []
+    start = 0.0
+    while start < duration:
+        segments.append((start, min(segment_seconds + overlap_seconds, duration - start)))
+        start += segment_seconds
+    return segments
+
+
+def stitch_segments(results, overlap_seconds, duration=None):
+    """
+    Merge per segment records into one, shifting word timings by the segment start.
+    the overlap between two segments is split in the middle: words starting before the midpoint come from
+    the earlier segment, the rest from the later one, so nothing in the overlap is said twice.
+    """
+    words = []
+    for i, (start, record) in enumerate(results):
+        keep_from = start + overlap_seconds / 2 if i > 0 else float('-inf')
+        keep_until = results[i + 1][0] + overlap_seconds / 2 if i + 1 < len(results) else float('inf')
+        first = True
+        for word in record['words']:
+            shifted = {**word, 'start': word['start'] + start, 'end': word['end'] + start}
+            if not keep_from <= shifted['start'] < keep_until:
+                continue
+            # a word right on the midpoint can be timed a bit differently by both segments and show up twice.
+            # only the first word a segment contributes can be such a copy, repeats inside a segment are real speech.
+            at_seam = i > 0 and first
+            first = False
+            if at_seam and words and words[-1]['word'] == shifted['word'] and shifted['start'] - words[-1]['start'] < 0.5:
+                continue
+            words.append(shifted)
+
+    transcript = ' '.join(word.get('punctuated_word') or word['word'] for word in words)
+    if not words:
+        # no word timings at all, fall back to gluing the transcripts together
+        transcript = ' '.join(record['transcript'] for _, record in results if record['transcript'])
+    return {'transcript': transcript, 'duration': duration, 'words': words}
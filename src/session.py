@@ -0,0 +1,84 @@
+# src/session.py
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import streamlit as st
+
+from .config import Config
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_processor():
+    # unstructured and PIL are only imported the first time a tab needs the processor
+    from .pdf_processor import get_pdf_processor
+    return get_pdf_processor()
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_chroma_client():
+    """one chroma client for every session"""
+    from .vectors import get_chroma_client
+    return get_chroma_client()
+
+
+_last_prune = 0.0
+_prune_lock = threading.Lock()
+
+
+def prune_expired_collections():
+    """
+    Drop expired session collections, at most once every SESSION_PRUNE_INTERVAL_MINUTES.
+    cheap enough to call on every rerun, a long running server keeps cleaning up instead of only on startup.
+    """
+    global _last_prune
+    cfg = Config()
+    with _prune_lock:
+        if time.time() - _last_prune < cfg.SESSION_PRUNE_INTERVAL_MINUTES * 60:
+            return
+        _last_prune = time.time()
+    from .vectors import prune_collections
+    try:
+        prune_collections(_shared_chroma_client(), cfg.SESSION_COLLECTION_PREFIX, cfg.SESSION_COLLECTION_TTL_HOURS * 3600)
+    except Exception as e:
+        print(f"Could not prune session collections: {e}")
+
+
+def get_session_processor():
+    """PDF processor shared by all sessions, it holds no per document state"""
+    return _shared_processor()
+
+
+def get_session_collection_name() -> str:
+    """every browser session writes into its own collection, so sessions never see or block each other's documents"""
+    if "collection_name" not in st.session_state:
+        st.session_state.collection_name = f"{Config().SESSION_COLLECTION_PREFIX}{uuid.uuid4().hex}"
+    return st.session_state.collection_name
+
+
+def get_session_upload_dir() -> str:
+    """one upload folder per session, so two users uploading "notes.pdf" don't overwrite each other"""
+    upload_dir = os.path.join(tempfile.gettempdir(), "fluxora_uploads", get_session_collection_name())
+    os.makedirs(upload_dir, exist_ok=True)
+    return upload_dir
+
+
+def get_session_store():
+    """
+    Vector store for this session's collection.
+    the store is a thin wrapper, the chroma client and the embedding model behind it are shared by the whole process.
+    """
+    prune_expired_collections()
+    if "vector_store" not in st.session_state:
+        from .vectors import setup_vs
+        st.session_state.vector_store = setup_vs(
+            os.getenv("GEMINI_API_KEY", "").strip() or None,
+            collection_name=get_session_collection_name(),
+            client=_shared_chroma_client(),
+        )
+    # a collection whose index was dropped as idle gets it back before the next question needs it
+    from .vectors import warm_keyword_index
+    warm_keyword_index(st.session_state.vector_store)
+    return st.session_state.vector_store
@@ -4,8 +4,10 @@ from pathlib import Path
 from typing import Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
 from .config import Config
-from .trans import youtube_to_transcript
-import os
+from .llm_pool import get_chat_model
+from .trans import youtube_to_transcript, extract_video_id
+from .mapreduce import condense_text
+import time
 
 def _read_text_utf8(path: str) -> str:
     # Read robustly as UTF-8, ignoring bad bytes if any
@@ -19,16 +21,14 @@ def generate_enhanced_summary(text: str, llm: Optional[ChatGoogleGenerativeAI] =
     """Generate an enhanced summary with key points and insights using Gemini Pro"""
     cfg = Config()
     if llm is None:
-        llm = ChatGoogleGenerativeAI(
-            model=cfg.CHAT_MODEL_BEST,
-            temperature=0.3,
-            google_api_key=cfg.GEMINI_API_KEY,
-            transport="rest"
-        )
+        llm = get_chat_model(cfg.CHAT_MODEL_BEST, temperature=0.3, transport="rest")
     
     if not text.strip():
         return {"summary": "Text is empty or unreadable.", "key_points": [], "insights": ""}
     
+    # long transcripts are condensed with map-reduce first so the prompt below always fits
+    text = condense_text(text, llm, focus="key points and notable insights")
+    
     prompt = f"""
     Analyze the following text and provide a comprehensive analysis:
     
@@ -87,18 +87,18 @@ def generate_enhanced_summary(text: str, llm: Optional[ChatGoogleGenerativeAI] =
     return sections
 
 def summarize_text_file(path: str, llm: Optional[ChatGoogleGenerativeAI] = None) -> str:
+    return summarize_text(_read_text_utf8(path), llm)
+
+def summarize_text(text: str, llm: Optional[ChatGoogleGenerativeAI] = None) -> str:
     cfg = Config()
     if llm is None:
-        llm = ChatGoogleGenerativeAI(
-            model=cfg.CHAT_MODEL_BEST,
-            temperature=0.3,
-            google_api_key=cfg.GEMINI_API_KEY,
-            transport="rest"
-        )
-    text = _read_text_utf8(path)
+        llm = get_chat_model(cfg.CHAT_MODEL_BEST, temperature=0.3, transport="rest")
     if not text.strip():
         return "File is empty or unreadable."
     
+    # long transcripts are condensed with map-reduce first so the prompt below always fits
+    text = condense_text(text, llm)
+    
     prompt = (
         "You are a helpful assistant. Read the text below and produce a concise summary "
         "according to the text given in bullet points. highlighting key facts, concepts, numbers, and decisions. "
@@ -118,12 +118,25 @@ def render_txt_summary_ui(url: str = "./texts"):
     st.header("YouTube Video Summarizer")
     st.write("Enter a YouTube URL to get a comprehensive analysis of the video content using Gemini Pro.")
     
-    # Main input
-    youtube_url = st.text_input(
-        "Enter YouTube URL:", 
-        placeholder="https://www.youtube.com/watch?v=..."
+    mode = st.radio(
+        "Mode:",
+        ["Single Video", "Batch"],
+        horizontal=True,
+        help="Batch takes a playlist or several URLs and summarizes them all in one run"
     )
     
+    # Main input
+    if mode == "Batch":
+        urls_text = st.text_area(
+            "Enter YouTube URLs or playlists (one per line):",
+            placeholder="https://www.youtube.com/playlist?list=...\nhttps://www.youtube.com/watch?v=..."
+        )
+    else:
+        youtube_url = st.text_input(
+            "Enter YouTube URL:", 
+            placeholder="https://www.youtube.com/watch?v=..."
+        )
+    
     # Processing options
     with st.expander("Analysis Options"):
         analysis_type = st.selectbox(
@@ -138,6 +151,10 @@ def render_txt_summary_ui(url: str = "./texts"):
             help="Save the transcript as a text file for future reference"
         )
     
+    if mode == "Batch":
+        _render_batch_ui(urls_text, analysis_type)
+        return
+    
     if st.button("Analyze Video", type="primary"):
         if not youtube_url.strip():
             st.error("Please enter a YouTube URL")
@@ -185,12 +202,7 @@ def render_txt_summary_ui(url: str = "./texts"):
                     
                 else:
                     # Standard summary
-                    temp_file = "temp_transcript.txt"
-                    with open(temp_file, "w", encoding="utf-8") as f:
-                        f.write(transcript_text)
-                    
-                    summary = summarize_text_file(temp_file)
-                    os.remove(temp_file)
+                    summary = summarize_text(transcript_text)
                     
                     st.success("Summary generated successfully!")
                     st.subheader("Summary")
@@ -215,12 +227,7 @@ def render_txt_summary_ui(url: str = "./texts"):
             if save_transcript:
                 try:
                     # Extract video ID for filename
-                    if "watch?v=" in youtube_url:
-                        video_id = youtube_url.split("watch?v=")[-1].split("&")[0]
-                    elif "youtu.be/" in youtube_url:
-                        video_id = youtube_url.split("youtu.be/")[-1].split("?")[0]
-                    else:
-                        video_id = "unknown"
+                    video_id = extract_video_id(youtube_url) or "unknown"
                     
                     transcript_file = f"transcript_{video_id}.txt"
                     with open(transcript_file, "w", encoding="utf-8") as f:
@@ -260,3 +267,74 @@ def render_txt_summary_ui(url: str = "./texts"):
                 st.write("- Video has no audio track") 
                 st.write("- Network connectivity issues")
                 st.write("- Invalid YouTube URL format")
+
+
+def _render_batch_result(container, result: dict):
+    """one finished or failed video of a batch"""
+    import streamlit as st
+    
+    if result['stage'] == "error":
+        container.error(f"{result['index']+1}. {result['url']}: {result['error']}")
+        return
+    with container.expander(f"{result['index']+1}. {result['video_id']}", expanded=False):
+        st.caption(result['url'])
+        st.markdown(result['summary'])
+        analysis = result.get('analysis')
+        if analysis and analysis['key_points']:
+            st.subheader("Key Points")
+            for point in analysis['key_points']:
+                st.markdown(f"- {point}")
+        if analysis and analysis['insights']:
+            st.subheader("Insights & Takeaways")
+            st.markdown(analysis['insights'])
+        st.download_button(
+            label="Download Transcript",
+            data=result['transcript'],
+            file_name=f"transcript_{result['video_id']}.txt",
+            mime="text/plain",
+            key=f"batch_transcript_{result['index']}"
+        )
+
+def _render_batch_ui(urls_text: str, analysis_type: str):
+    """Run a batch and show every video as soon as it is finished"""
+    import streamlit as st
+    import asyncio
+    from .batch_summary import expand_urls, run_batch
+    
+    if not st.button("Analyze Videos", type="primary"):
+        # keep the last batch on screen, e.g. after a download button reran the script
+        for result in st.session_state.get("batch_results", []):
+            _render_batch_result(st, result)
+        return
+    if not urls_text.strip():
+        st.error("Please enter at least one YouTube URL")
+        return
+    
+    with st.spinner("Reading URLs and playlists..."):
+        urls = expand_urls(urls_text)
+    if not urls:
+        st.error("No videos found in the given URLs")
+        return
+    
+    progress = st.progress(0.0, text=f"0 of {len(urls)} videos finished")
+    status = st.empty()
+    results_area = st.container()
+    stages = {}
+    
+    def on_update(result):
+        # runs on the script thread, the event loop lives there
+        stages[result['index']] = result['stage']
+        finished = sum(1 for stage in stages.values() if stage in ("done", "error"))
+        progress.progress(finished / len(urls), text=f"{finished} of {len(urls)} videos finished")
+        counts = {stage: list(stages.values()).count(stage) for stage in ("download", "transcribe", "summarize")}
+        status.caption(f"Downloading: {counts['download']} | Transcribing: {counts['transcribe']} | Summarizing: {counts['summarize']}")
+        if result['stage'] in ("done", "error"):
+            _render_batch_result(results_area, result)
+    
+    started = time.time()
+    results = asyncio.run(run_batch(urls, analysis_type, on_update))
+    st.session_state.batch_results = results
+    
+    done = sum(1 for result in results if result['stage'] == "done")
+    status.empty()
+    st.success(f"Processed {done} of {len(results)} videos in {time.time() - started:.0f}s")
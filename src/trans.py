@@ -1,7 +1,15 @@
+import asyncio
 import os
+import re
+import shutil
+import subprocess
+import tempfile
+import aiohttp
 import yt_dlp
 from deepgram import Deepgram
 from .config import Config
+from .segments import plan_segments, stitch_segments
+from .transcript_store import get_transcript_store
 
 _dg_client = None  # lazy singleton
 
@@ -16,11 +24,9 @@ def _get_deepgram_client() -> Deepgram:
         _dg_client = Deepgram(key)
     return _dg_client
 
-def download_youtube_audio(youtube_url, output_dir="downloads"):
-    """Download YouTube video as WAV audio file"""
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Extract video ID properly, handling URL parameters
+def extract_video_id(youtube_url):
+    """Extract the video ID from a YouTube URL, handling URL parameters"""
+    youtube_url = youtube_url.strip()
     if 'v=' in youtube_url:
         video_id = youtube_url.split('v=')[1].split('&')[0]
     elif 'youtu.be/' in youtube_url:
@@ -28,81 +34,300 @@ def download_youtube_audio(youtube_url, output_dir="downloads"):
     else:
         # Fallback: use last part of URL
         video_id = youtube_url.split('/')[-1].split('?')[0]
+    # only characters a youtube id can have, the id is also used in file names
+    return re.sub(r'[^A-Za-z0-9_-]', '', video_id.split('#')[0])
+
+# mimetypes deepgram needs to be told for each audio container we can end up with
+AUDIO_MIMETYPES = {
+    'opus': 'audio/ogg',
+    'ogg': 'audio/ogg',
+    'webm': 'audio/webm',
+    'm4a': 'audio/mp4',
+    'mp4': 'audio/mp4',
+    'mp3': 'audio/mpeg',
+    'flac': 'audio/flac',
+    'wav': 'audio/wav',
+}
+
+def audio_mimetype(file_path):
+    """Mimetype for an audio file based on its extension"""
+    ext = os.path.splitext(file_path)[1].lstrip('.').lower()
+    return AUDIO_MIMETYPES.get(ext, 'application/octet-stream')
+
+def _audio_ydl_opts(output_template, audio_format):
+    """
+    yt-dlp options for the configured audio format.
+    "native" keeps the compressed stream youtube serves (opus/m4a) as is, no transcoding at all.
+    "opus" and "flac" transcode to mono, opus at a low speech friendly bitrate.
+    "wav" is the old uncompressed pcm output.
+    """
+    ydl_opts = {
+        'format': 'bestaudio[acodec=opus]/bestaudio[ext=m4a]/bestaudio/best',
+        'outtmpl': output_template,
+        'quiet': True,
+    }
+    if audio_format != 'native':
+        postprocessor = {'key': 'FFmpegExtractAudio', 'preferredcodec': audio_format}
+        if audio_format == 'opus':
+            postprocessor['preferredquality'] = str(Config().AUDIO_OPUS_BITRATE_KBPS)
+        ydl_opts['postprocessors'] = [postprocessor]
+        if audio_format in ('opus', 'flac'):
+            # speech doesn't need stereo, mono halves the bytes again
+            ydl_opts['postprocessor_args'] = {'extractaudio+ffmpeg_o': ['-ac', '1']}
+    return ydl_opts
+
+def download_youtube_audio(youtube_url, output_dir="downloads", audio_format=None):
+    """Download YouTube audio, compressed unless Config.AUDIO_FORMAT says otherwise"""
+    os.makedirs(output_dir, exist_ok=True)
+    audio_format = audio_format or Config().AUDIO_FORMAT
+    
+    video_id = extract_video_id(youtube_url)
     
     # Use absolute path to avoid working directory issues
     abs_output_dir = os.path.abspath(output_dir)
     output_template = os.path.join(abs_output_dir, f"{video_id}.%(ext)s")
     
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'outtmpl': output_template,
-        'quiet': True,
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'wav',
-        }]
-    }
+    ydl_opts = _audio_ydl_opts(output_template, audio_format)
     
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(youtube_url, download=True)
-            final_path = os.path.join(abs_output_dir, f"{info['id']}.wav")
             
-            # Check if file actually exists
-            if os.path.exists(final_path):
+            # yt-dlp reports the final path, after any postprocessing changed the extension
+            downloads = info.get('requested_downloads') or []
+            final_path = downloads[0].get('filepath') if downloads else None
+            if final_path and os.path.exists(final_path):
                 return final_path
-            else:
-                # Try alternative naming patterns
-                alt_path = os.path.join(abs_output_dir, f"{video_id}.wav")
-                if os.path.exists(alt_path):
-                    return alt_path
-                
-                # List files for debugging
-                files = os.listdir(abs_output_dir) if os.path.exists(abs_output_dir) else []
-                raise FileNotFoundError(f"WAV file not found. Expected: {final_path}, Files in directory: {files}")
+            
+            # Try alternative naming patterns
+            for name_id in (info.get('id'), video_id):
+                for ext in AUDIO_MIMETYPES:
+                    alt_path = os.path.join(abs_output_dir, f"{name_id}.{ext}")
+                    if os.path.exists(alt_path):
+                        return alt_path
+            
+            # List files for debugging
+            files = os.listdir(abs_output_dir) if os.path.exists(abs_output_dir) else []
+            raise FileNotFoundError(f"Audio file not found. Expected: {final_path}, Files in directory: {files}")
                 
     except Exception as e:
         raise Exception(f"Error downloading YouTube audio: {str(e)}")
 
-async def transcribe_audio(file_path):
-    """Transcribe audio file using Deepgram"""
+def _transcript_record(response):
+    """the parts of a deepgram response we keep: transcript, duration and word timings"""
+    alternative = response['results']['channels'][0]['alternatives'][0]
+    return {
+        'transcript': alternative.get('transcript', ''),
+        'duration': response.get('metadata', {}).get('duration'),
+        'words': alternative.get('words', []),
+    }
+
+async def transcribe_audio_detailed(file_path):
+    """Transcribe audio file using Deepgram, returning transcript, duration and word timings"""
     client = _get_deepgram_client()  # Get client lazily
     
     with open(file_path, 'rb') as audio_file:
-        source = {'buffer': audio_file, 'mimetype': 'audio/wav'}
+        source = {'buffer': audio_file, 'mimetype': audio_mimetype(file_path)}
         response = await client.transcription.prerecorded(source, {'punctuate': True})
-        return response['results']['channels'][0]['alternatives'][0]['transcript']
+        return _transcript_record(response)
 
-async def youtube_to_transcript(youtube_url):
-    """Download YouTube video and convert to transcript"""
-    wav_file = None
+def probe_duration(source, headers=None):
+    """Length of an audio file or url in seconds, read by ffprobe"""
+    args = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1']
+    if headers:
+        args += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    output = subprocess.run(args + [source], capture_output=True, text=True, check=True).stdout
+    return float(output.strip())
+
+async def _cut_segment(source, start, length, out_path, headers=None):
+    """
+    Cut one segment out of a file or url with ffmpeg.
+    it is re-encoded to mono opus so every segment starts exactly at `start`, stream copy would snap to the nearest packet.
+    """
+    args = ['ffmpeg', '-nostdin', '-loglevel', 'error', '-y']
+    if headers:
+        args += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    # cut into a temp name and move it in place only on success, a half written segment must never look done
+    root, ext = os.path.splitext(out_path)
+    tmp_path = f"{root}.part{ext}"
+    args += [
+        '-ss', f"{start:.3f}", '-t', f"{length:.3f}", '-i', source,
+        '-vn', '-ac', '1', '-c:a', 'libopus', '-b:a', f"{Config().AUDIO_OPUS_BITRATE_KBPS}k",
+        tmp_path,
+    ]
+    try:
+        process = await asyncio.create_subprocess_exec(*args, stderr=asyncio.subprocess.PIPE)
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0:
+            raise Exception(f"ffmpeg could not cut segment at {start:.0f}s: {stderr.decode(errors='ignore').strip()}")
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+async def transcribe_segments(source, duration, headers=None):
+    """
+    Transcribe long audio as overlapping segments, at most TRANSCRIBE_MAX_CONCURRENCY at a time.
+    each segment is retried on its own so one failed request doesn't throw away the whole transcription.
+    """
+    cfg = Config()
+    segments = plan_segments(duration, cfg.TRANSCRIBE_SEGMENT_SECONDS, cfg.TRANSCRIBE_SEGMENT_OVERLAP_SECONDS)
+    print(f"Transcribing {duration:.0f}s of audio in {len(segments)} segments")
+    semaphore = asyncio.Semaphore(cfg.TRANSCRIBE_MAX_CONCURRENCY)
+    segment_dir = tempfile.mkdtemp(prefix="fluxora_segments_")
+
+    async def transcribe_segment(index, start, length):
+        async with semaphore:
+            segment_path = os.path.join(segment_dir, f"{index:05d}.ogg")
+            for attempt in range(cfg.TRANSCRIBE_SEGMENT_RETRIES + 1):
+                try:
+                    if not os.path.exists(segment_path):
+                        await _cut_segment(source, start, length, segment_path, headers)
+                    record = await transcribe_audio_detailed(segment_path)
+                    os.remove(segment_path)
+                    return start, record
+                except Exception as e:
+                    if attempt == cfg.TRANSCRIBE_SEGMENT_RETRIES:
+                        raise Exception(f"Segment {index+1}/{len(segments)} failed: {str(e)}")
+                    print(f"Segment {index+1}/{len(segments)} failed ({str(e)}), retrying")
+                    await asyncio.sleep(2 ** attempt)
+
+    tasks = [asyncio.ensure_future(transcribe_segment(i, start, length)) for i, (start, length) in enumerate(segments)]
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        # gather doesn't stop the other segments when one fails, they would still be
+        # cutting and uploading files out of the directory we are about to delete.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        shutil.rmtree(segment_dir, ignore_errors=True)
+    return stitch_segments(results, cfg.TRANSCRIBE_SEGMENT_OVERLAP_SECONDS, duration)
+
+def _is_long(duration):
+    """long enough that parallel segments beat one request"""
+    cfg = Config()
+    return bool(duration) and duration > cfg.TRANSCRIBE_SEGMENT_SECONDS + cfg.TRANSCRIBE_SEGMENT_OVERLAP_SECONDS
+
+async def transcribe_audio_chunked(file_path):
+    """Transcribe an audio file, long files are split into segments that are transcribed in parallel"""
+    try:
+        duration = await asyncio.to_thread(probe_duration, file_path)
+    except Exception as e:
+        print(f"Could not read audio duration ({str(e)}), transcribing in one request")
+        duration = None
+    if _is_long(duration):
+        return await transcribe_segments(file_path, duration)
+    return await transcribe_audio_detailed(file_path)
+
+async def transcribe_audio(file_path):
+    """Transcribe audio file using Deepgram"""
+    record = await transcribe_audio_chunked(file_path)
+    return record['transcript']
+
+def resolve_audio_stream(youtube_url):
+    """Find the direct URL of the best compressed audio stream without downloading anything"""
+    ydl_opts = {
+        'format': 'bestaudio[acodec=opus]/bestaudio[ext=m4a]/bestaudio',
+        'quiet': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(youtube_url, download=False)
+    audio_format = (info.get('requested_formats') or [info])[0]
+    return {
+        'url': audio_format['url'],
+        'headers': audio_format.get('http_headers') or info.get('http_headers') or {},
+        'mimetype': AUDIO_MIMETYPES.get(audio_format.get('ext', ''), 'application/octet-stream'),
+        'duration': info.get('duration'),
+    }
+
+async def _stream_audio_bytes(url, headers, chunk_size):
+    """yield the audio in chunks straight from youtube, nothing is written to disk"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url, headers=headers) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                yield chunk
+
+async def transcribe_youtube_stream(youtube_url, stream=None):
+    """
+    Pipe the audio from youtube into the deepgram request while it downloads.
+    the upload runs as the download does, so the total time is close to the slower of the two instead of their sum.
+    `stream` is what resolve_audio_stream returned, when the caller already looked it up.
+    """
+    if stream is None:
+        stream = await asyncio.to_thread(resolve_audio_stream, youtube_url)
+    if _is_long(stream['duration']):
+        # long videos: ffmpeg seeks into the stream url, each segment only fetches its own part
+        return await transcribe_segments(stream['url'], stream['duration'], stream['headers'])
+    
+    client = _get_deepgram_client()  # Get client lazily
+    
+    source = {
+        'buffer': _stream_audio_bytes(stream['url'], stream['headers'], Config().AUDIO_STREAM_CHUNK_BYTES),
+        'mimetype': stream['mimetype'],
+    }
+    response = await client.transcription.prerecorded(source, {'punctuate': True})
+    record = _transcript_record(response)
+    if record['duration'] is None:
+        record['duration'] = stream['duration']
+    return record
+
+async def download_and_transcribe(youtube_url):
+    """Download the audio to a private temp dir, transcribe it and clean up"""
+    # every call gets its own directory so concurrent users never touch each other's files
+    download_dir = tempfile.mkdtemp(prefix="fluxora_audio_")
     try:
         # Step 1: Download audio from YouTube
         print(f"Downloading audio from: {youtube_url}")
-        wav_file = download_youtube_audio(youtube_url)
-        print(f"Audio downloaded to: {wav_file}")
+        audio_file_path = download_youtube_audio(youtube_url, output_dir=download_dir)
+        print(f"Audio downloaded to: {audio_file_path}")
         
         # Step 2: Transcribe the audio using Deepgram
         print("Starting transcription...")
-        transcript = await transcribe_audio(wav_file)
+        return await transcribe_audio_chunked(audio_file_path)
+    finally:
+        # Step 3: Clean up the audio file, even if transcription fails
+        shutil.rmtree(download_dir, ignore_errors=True)
+        print(f"Cleaned up audio files in: {download_dir}")
+
+async def youtube_to_transcript(youtube_url):
+    """Download YouTube video and convert to transcript"""
+    # the same video was transcribed before, no need to download or transcribe it again
+    video_id = extract_video_id(youtube_url)
+    store = get_transcript_store()
+    stored = store.get(video_id) if video_id else None
+    if stored is not None:
+        print(f"Using stored transcript for video: {video_id}")
+        return stored['transcript']
+    
+    try:
+        record = None
+        if Config().TRANSCRIBE_STREAMING:
+            try:
+                print(f"Streaming audio from {youtube_url} into transcription...")
+                record = await transcribe_youtube_stream(youtube_url)
+            except Exception as e:
+                # e.g. the stream url is locked to another ip, the normal download still works then
+                print(f"Streaming transcription failed ({str(e)}), falling back to download")
+        
+        if record is None:
+            record = await download_and_transcribe(youtube_url)
+        
+        transcript = record['transcript']
         print(f"Transcription complete. Length: {len(transcript) if transcript else 0} characters")
         
-        # Step 3: Clean up the wav file
-        if wav_file and os.path.exists(wav_file):
-            os.remove(wav_file)
-            print(f"Cleaned up audio file: {wav_file}")
+        # keep it for the next analysis of this video, empty transcripts are not worth keeping
+        if video_id and transcript and transcript.strip():
+            store.put(video_id, {'video_id': video_id, **record})
             
         return transcript
         
     except Exception as e:
-        # Clean up file even if transcription fails
-        if wav_file and os.path.exists(wav_file):
-            try:
-                os.remove(wav_file)
-                print(f"Cleaned up audio file after error: {wav_file}")
-            except:
-                pass
-        
         print(f"Error in youtube_to_transcript: {str(e)}")
         raise Exception(f"Error processing transcript: {str(e)}")
-
@@ -0,0 +1,49 @@
+# src/transcript_store.py
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from .config import Config
+from .disk_cache import DiskCache
+
+
+class TranscriptStore(DiskCache):
+    """
+    Transcripts keyed by youtube video id.
+    every entry holds the transcript text, the audio duration and the word timings from deepgram,
+    so analysing the same video again never downloads or transcribes anything.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        super().__init__(cache_dir, max_bytes, suffix=".json")
+
+    def get(self, video_id: str) -> Optional[Dict[str, Any]]:
+        data = self.get_bytes(video_id)
+        if data is None:
+            return None
+        try:
+            return json.loads(data)
+        except Exception as e:
+            print(f"Could not read stored transcript {video_id}: {e}")
+            return None
+
+    def put(self, video_id: str, record: Dict[str, Any]):
+        self.put_bytes(video_id, json.dumps(record).encode("utf-8"))
+
+
+_transcript_store = None  # lazy singleton
+_transcript_store_lock = threading.Lock()
+
+
+def get_transcript_store() -> TranscriptStore:
+    """Get the process wide transcript store, creating it lazily on first use"""
+    global _transcript_store
+    with _transcript_store_lock:
+        if _transcript_store is None:
+            cfg = Config()
+            _transcript_store = TranscriptStore(
+                os.path.join(cfg.CACHE_DIR, "transcripts"),
+                cfg.TRANSCRIPT_CACHE_MAX_BYTES,
+            )
+    return _transcript_store
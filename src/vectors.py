@@ -2,13 +2,23 @@ from langchain_core import embeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
-from typing import List, Dict, Any
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Optional, Tuple
+import hashlib
+import itertools
 import os
+import threading
+import time
 
 from .config import Config
+from .answer_cache import get_answer_cache
+from .blob_store import put_blob, sweep_blobs
+from .embedder import embed_texts
+from .ratelimit import get_limiter
+from .keyword_index import KeywordIndex, reciprocal_rank_fusion
 
 
-def setup_vs(api_key=None, collection_name: str = "docs"):
+def _resolve_api_key(api_key=None) -> str:
  # Evaluate the API key at CALL time, not DEFINITION time
     if api_key is None:
         api_key = os.getenv("GEMINI_API_KEY", "")
@@ -19,13 +29,53 @@ def setup_vs(api_key=None, collection_name: str = "docs"):
     
     if not api_key:
         raise ValueError("GEMINI_API_KEY is required but not found")
+    return api_key
+
+
+_chroma_client = None  # lazy singleton
+_embedding_model = None  # lazy singleton
+_shared_lock = threading.Lock()
+
+
+def get_chroma_client(persist_directory: Optional[str] = None):
+    """One chroma client per process, so every session shares a single handle on the sqlite file"""
+    global _chroma_client
+    with _shared_lock:
+        if _chroma_client is None:
+            import chromadb
+            _chroma_client = chromadb.PersistentClient(path=persist_directory or Config().CHROMA_DB_PATH)
+    return _chroma_client
 
-    config = Config()
 
+def get_embedding_model(api_key=None) -> GoogleGenerativeAIEmbeddings:
+    """One embedding client per process, it keeps its http connections open between requests"""
+    global _embedding_model
+    with _shared_lock:
+        if _embedding_model is None:
+            _embedding_model = GoogleGenerativeAIEmbeddings(
+                    google_api_key=_resolve_api_key(api_key),
+                    model=Config.EMBEDDING_MODEL,
+                    transport="rest"
+                    )
+    return _embedding_model
 
 
+def setup_vs(api_key=None, collection_name: str = "docs", client=None):
+    """
+    Chroma store for one collection.
+    with `client` the store is only a thin wrapper around the shared client and embedding model,
+    without it a separate client and embedding model are created like before.
+    """
+    if client is not None:
+        return Chroma(
+            client=client,
+            collection_name=collection_name,
+            embedding_function=get_embedding_model(api_key),
+            collection_metadata={"created": time.time(), "last_used": time.time()},
+        )
+
     embeddings = GoogleGenerativeAIEmbeddings(
-            google_api_key= api_key,
+            google_api_key= _resolve_api_key(api_key),
             model= Config.EMBEDDING_MODEL,
             transport="rest"
             )
@@ -36,6 +86,227 @@ def setup_vs(api_key=None, collection_name: str = "docs"):
         persist_directory="./chroma_db"
         )
 
+
+def prune_collections(client, prefix: str, max_age_seconds: float) -> int:
+    """
+    Drop collections named `prefix`... that were not used (queried or ingested into) for max_age_seconds,
+    per session collections would otherwise pile up in chroma_db forever. returns how many were dropped.
+    """
+    removed = 0
+    now = time.time()
+    for collection in client.list_collections():
+        name = collection.name
+        if not name.startswith(prefix):
+            continue
+        metadata = collection.metadata or {}
+        # collections from before last_used was recorded only have their creation time
+        last_used = metadata.get("last_used") or metadata.get("created")
+        if last_used is None or now - last_used < max_age_seconds:
+            continue
+        try:
+            client.delete_collection(name)
+        except Exception as e:
+            print(f"Could not drop collection {name}: {e}")
+            continue
+        _forget_collection(name)
+        removed += 1
+    if removed:
+        print(f"Dropped {removed} expired {prefix} collections")
+        try:
+            collect_blob_garbage(client)
+        except Exception as e:
+            print(f"Could not clean up the blob store: {e}")
+    return removed
+
+
+def collect_blob_garbage(client) -> int:
+    """
+    Delete blobs no chunk of any collection points to anymore, returns how many were deleted.
+    images and table html of dropped collections and deleted sources would otherwise stay on disk forever.
+    """
+    referenced = set()
+    page_size = 5000
+    for collection in client.list_collections():
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            metadatas = (page.get("metadatas") or []) if page else []
+            if not metadatas:
+                break
+            for metadata in metadatas:
+                for key in ("image_ref", "html_ref"):
+                    if metadata and metadata.get(key):
+                        referenced.add(metadata[key])
+            offset += len(metadatas)
+    removed = sweep_blobs(referenced)
+    if removed:
+        print(f"Deleted {removed} unreferenced blobs")
+    return removed
+
+
+# one bm25 index per chroma collection, built from the collection on first query and then kept in sync.
+_keyword_indexes: Dict[str, KeywordIndex] = {}
+_keyword_indexes_lock = threading.Lock()
+# collections with in memory state (keyword index, corpus version, cached answers), least recently used first.
+_recent_collections: "OrderedDict[str, float]" = OrderedDict()
+# collection name -> lock held while its index is being built, so only sessions of that collection wait.
+_keyword_build_locks: Dict[str, threading.Lock] = {}
+# collection name -> writes that came in while its index was being built, see _sync_keyword_index.
+_pending_index_changes: Dict[str, List[Tuple[str, tuple]]] = {}
+
+
+def _forget_collection(name: str):
+    """drop everything kept in memory for a collection, the keyword index is rebuilt from chroma if it is used again"""
+    with _keyword_indexes_lock:
+        _keyword_indexes.pop(name, None)
+        _corpus_versions.pop(name, None)
+        _recent_collections.pop(name, None)
+        _last_used_written.pop(name, None)
+    get_answer_cache().invalidate(name)
+
+
+def _touch_collection(name: str):
+    """
+    mark the collection as used. past MAX_IN_MEMORY_COLLECTIONS the least recently used ones are forgotten,
+    every index holds a copy of its collection's text and metadata.
+    """
+    limit = Config().MAX_IN_MEMORY_COLLECTIONS
+    with _keyword_indexes_lock:
+        _recent_collections[name] = time.time()
+        _recent_collections.move_to_end(name)
+        idle = list(_recent_collections)[:max(0, len(_recent_collections) - limit)]
+    for idle_name in idle:
+        _forget_collection(idle_name)
+    if idle:
+        print(f"Dropped in memory state of {len(idle)} idle collections")
+
+
+# collection name -> when last_used was last written to chroma, so a busy session doesn't write on every question.
+_last_used_written: Dict[str, float] = {}
+LAST_USED_RESOLUTION_SECONDS = 600
+
+
+def _mark_used(store):
+    """record in the collection metadata that it is in use, prune_collections drops collections idle for too long"""
+    name = store._collection.name
+    now = time.time()
+    with _keyword_indexes_lock:
+        if now - _last_used_written.get(name, 0.0) < LAST_USED_RESOLUTION_SECONDS:
+            return
+        _last_used_written[name] = now
+    try:
+        # modify replaces the whole metadata, keep what is there. the hnsw settings can't be changed after creation.
+        metadata = {k: v for k, v in (store._collection.metadata or {}).items() if not k.startswith("hnsw:")}
+        store._collection.modify(metadata={**metadata, "last_used": now})
+    except Exception as e:
+        print(f"Could not record last use of {name}: {e}")
+
+
+def _build_keyword_index(store) -> KeywordIndex:
+    index = KeywordIndex()
+    page_size = 5000
+    offset = 0
+    while True:
+        page = store.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        ids = page.get("ids", []) if page else []
+        if not ids:
+            break
+        index.add(ids, page["documents"], page["metadatas"])
+        offset += len(ids)
+    return index
+
+
+def get_keyword_index(store) -> KeywordIndex:
+    """
+    Get the keyword index for this store's collection, building it from chroma the first time.
+    a big collection takes a while to index, the build runs outside the process wide lock
+    so other collections can be searched and built meanwhile.
+    """
+    name = store._collection.name
+    _touch_collection(name)
+    with _keyword_indexes_lock:
+        index = _keyword_indexes.get(name)
+        if index is not None:
+            return index
+        build_lock = _keyword_build_locks.setdefault(name, threading.Lock())
+
+    with build_lock:
+        # someone else might have built it while we waited
+        with _keyword_indexes_lock:
+            index = _keyword_indexes.get(name)
+        if index is not None:
+            return index
+
+        with _keyword_indexes_lock:
+            _pending_index_changes[name] = []
+        try:
+            index = _build_keyword_index(store)
+            # replay what was written meanwhile, until nothing new came in. registering happens under the
+            # same lock as the last check, so no write can slip in between.
+            while True:
+                with _keyword_indexes_lock:
+                    pending = _pending_index_changes[name]
+                    if not pending:
+                        _keyword_indexes[name] = index
+                        _keyword_build_locks.pop(name, None)
+                        # keep it evictable even if it was forgotten while building
+                        _recent_collections.setdefault(name, time.time())
+                        break
+                    _pending_index_changes[name] = []
+                for change, args in pending:
+                    getattr(index, change)(*args)
+        finally:
+            with _keyword_indexes_lock:
+                _pending_index_changes.pop(name, None)
+        print(f"Built keyword index for {name} with {len(index)} documents")
+        return index
+
+
+def warm_keyword_index(store):
+    """start building the collection's keyword index in the background if it is not in memory"""
+    name = store._collection.name
+    with _keyword_indexes_lock:
+        if name in _keyword_indexes or name in _keyword_build_locks:
+            return
+    threading.Thread(target=get_keyword_index, args=(store,), name=f"keyword-index-{name}", daemon=True).start()
+
+
+# set to a new number every time a collection's documents change, cached answers are only valid for one version.
+# the numbers come from one process wide counter, so a collection that was forgotten and starts over
+# never hands out a version an old cached answer still carries.
+_corpus_versions: Dict[str, int] = {}
+_version_counter = itertools.count(1)
+
+
+def get_corpus_version(store) -> int:
+    return _corpus_versions.get(store._collection.name, 0)
+
+
+def _corpus_changed(store):
+    name = store._collection.name
+    _touch_collection(name)
+    with _keyword_indexes_lock:
+        _corpus_versions[name] = next(_version_counter)
+    get_answer_cache().invalidate(name)
+
+
+def _sync_keyword_index(store, change: str, *args):
+    """
+    Apply a write to the collection's keyword index (change is "add", "remove" or "clear").
+    while the index is being built the change is queued and replayed on top of the snapshot,
+    a collection without an index picks up every change when it is built.
+    """
+    name = store._collection.name
+    with _keyword_indexes_lock:
+        index = _keyword_indexes.get(name)
+        if index is None:
+            pending = _pending_index_changes.get(name)
+            if pending is not None:
+                pending.append((change, args))
+            return
+    getattr(index, change)(*args)
+
+
 def clear_collection(store):
     """Clear all documents using ChromaDB methods only"""
     try:
@@ -43,6 +314,8 @@ def clear_collection(store):
         all_data = store._collection.get(include=[])
         if all_data and 'ids' in all_data and all_data['ids']:
             store._collection.delete(ids=all_data['ids'])
+            _sync_keyword_index(store, "clear")
+            _corpus_changed(store)
             print(f"Cleared {len(all_data['ids'])} documents")
         else:
             print("Collection already empty")
@@ -50,50 +323,162 @@ def clear_collection(store):
         print(f"Could not clear collection: {e}")
 
 
-def add_documents(store, elements: List[Dict[str, Any]]):
+def make_doc_id(source: str, content_type: str, page_content: str) -> str:
+    """deterministic id for a chunk, the same chunk of the same source always gets the same id"""
+    digest = hashlib.sha256()
+    for part in (source, content_type, page_content):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
 
-    clear_collection(store)
-    docs = []
 
-    for element in elements:
-        if element["content_type"] == "image":
-            page_content = f"Image: {element.get('image_desc', 'No image description')}"
-        elif element.get("content_type") == "table":
-            page_content = element["content"]
-            # add html conent if available
-            if element.get("html_content"):
-                page_content += f"\nTable HTML: {element['html_content']}"
-        else:
-            page_content = element["content"]
-
-        # create document with metadata
-
-        docs=[] 
-        doc = Document(
-                page_content=page_content,
-                # metadata={
-                    # merge operator to put all key values into outer dict.
-                    # **(element.get("metadata",{}))
-                    # }
-                # )
-                metadata = {
-                "type": element.get("type", "unknown"),
-                "content_type": element.get("content_type", "text"),
-                "source": element.get("source", "unknown"),
-                "id": element.get("id", "unknown"),
-                # Add image data if available
-                "image_data": element.get("image_data", ""),
-                "image_desc": element.get("image_desc", ""),
-                "html_content": element.get("html_content", "")
-            }
+def delete_source(store, source: str) -> int:
+    """Delete every chunk that came from `source`, returns how many were removed"""
+    existing = store.get(where={"source": source}, include=[])
+    ids = existing.get("ids", []) if existing else []
+    if ids:
+        store.delete(ids=ids)
+        _sync_keyword_index(store, "remove", ids)
+        _corpus_changed(store)
+        print(f"Deleted {len(ids)} documents from {source}")
+    return len(ids)
+
+
+def _element_to_document(element: Dict[str, Any]) -> Document:
+    if element["content_type"] == "image":
+        page_content = f"Image: {element.get('image_desc', 'No image description')}"
+    else:
+        # tables are embedded by their text, the html only lives in the blob store (html_ref)
+        page_content = element["content"]
+
+    source = element.get("source", "unknown")
+    content_type = element.get("content_type", "text")
+
+    # create document with metadata
+    return Document(
+            page_content=page_content,
+            metadata = {
+            "type": element.get("type", "unknown"),
+            "content_type": content_type,
+            "source": source,
+            "id": element.get("id", "unknown"),
+            "doc_id": make_doc_id(source, content_type, page_content),
+            # big blobs go to the blob store, the metadata only keeps a reference to them.
+            "image_ref": put_blob(element["image_data"]) if element.get("image_data") else "",
+            "image_desc": element.get("image_desc", ""),
+            "html_ref": put_blob(element["html_content"]) if element.get("html_content") else ""
+        }
+    )
+
+
+def _embed_and_store(store, ids: List[str], docs: List[Document], progress: Optional[Callable[[str, int, int], None]] = None):
+    """embed through the batched pipeline and write every batch to chroma as soon as it is ready"""
+    texts = [doc.page_content for doc in docs]
+    stored = [0]
+
+    def write_batch(positions: List[int], vectors: List[List[float]]):
+        batch_ids = [ids[i] for i in positions]
+        batch_texts = [texts[i] for i in positions]
+        batch_metadatas = [docs[i].metadata for i in positions]
+        store._collection.upsert(
+            ids=batch_ids,
+            embeddings=vectors,
+            documents=batch_texts,
+            metadatas=batch_metadatas,
         )
-        docs.append(doc)
-    
-    # Add all documents to the store
-    if docs:
-        store.add_documents(docs)
-        print(f"Added {len(docs)} documents to vector store")
+        _sync_keyword_index(store, "add", batch_ids, batch_texts, batch_metadatas)
+        if progress:
+            stored[0] += len(positions)
+            progress("chunks", stored[0], len(texts))
 
+    embed_texts(store.embeddings, texts, on_batch=write_batch)
 
-def query(store, query_text: str, k: int = 4):
-    return store.similarity_search(query_text, k=k)
+
+def add_documents(store, elements: List[Dict[str, Any]], progress: Optional[Callable[[str, int, int], None]] = None):
+    """
+    Upsert the elements into the store.
+    chunks that are already stored (same id) are skipped, so only new or changed chunks get embedded,
+    and chunks of the same source that are not in `elements` anymore are deleted.
+    other sources in the collection are left alone.
+    `progress("chunks", done, total)` is called as embedded chunks are written.
+    """
+    _mark_used(store)
+    # build the keyword index here, in the ingest worker, instead of on the user's first question.
+    get_keyword_index(store)
+
+    # group by source so every source is synced on its own.
+    docs_by_source: Dict[str, Dict[str, Document]] = {}
+    for element in elements:
+        doc = _element_to_document(element)
+        # dict keeps the first copy if the same chunk shows up twice in one source.
+        docs_by_source.setdefault(doc.metadata["source"], {}).setdefault(doc.metadata["doc_id"], doc)
+
+    new_docs = []
+    new_ids = []
+    changed = False
+    for source, docs in docs_by_source.items():
+        existing = store.get(where={"source": source}, include=[])
+        existing_ids = set(existing.get("ids", [])) if existing else set()
+
+        stale_ids = list(existing_ids - docs.keys())
+        if stale_ids:
+            store.delete(ids=stale_ids)
+            _sync_keyword_index(store, "remove", stale_ids)
+            changed = True
+            print(f"Removed {len(stale_ids)} stale documents from {source}")
+
+        for doc_id, doc in docs.items():
+            if doc_id not in existing_ids:
+                new_docs.append(doc)
+                new_ids.append(doc_id)
+
+    # only the new chunks hit the embedding api.
+    if progress:
+        progress("chunks", 0, len(new_docs))
+    if new_docs:
+        _embed_and_store(store, new_ids, new_docs, progress)
+        changed = True
+    if changed:
+        _corpus_changed(store)
+    total = sum(len(docs) for docs in docs_by_source.values())
+    print(f"Added {len(new_docs)} new documents to vector store ({total - len(new_docs)} already stored)")
+
+
+def embed_query(store, query_text: str) -> List[float]:
+    """embed a question once so retrieval and the answer cache can share the vector"""
+    get_limiter(Config().EMBEDDING_MODEL).acquire()
+    return store.embeddings.embed_query(query_text)
+
+
+def query(store, query_text: str, k: int = 4, query_embedding: Optional[List[float]] = None):
+    """
+    Hybrid retrieval: vector search and bm25 keyword search, merged with reciprocal rank fusion.
+    the keyword side catches exact identifiers (part numbers, clause numbers) that embeddings miss.
+    """
+    _mark_used(store)
+    config = Config()
+    fetch_k = max(k, config.HYBRID_FETCH_K)
+
+    if query_embedding is not None:
+        vector_docs = store.similarity_search_by_vector(query_embedding, k=fetch_k)
+    else:
+        vector_docs = store.similarity_search(query_text, k=fetch_k)
+    docs_by_id = {}
+    vector_ranking = []
+    for doc in vector_docs:
+        doc_id = doc.metadata.get("doc_id") or doc.id
+        docs_by_id[doc_id] = doc
+        vector_ranking.append(doc_id)
+
+    index = get_keyword_index(store)
+    keyword_ranking = [doc_id for doc_id, _ in index.search(query_text, k=fetch_k)]
+
+    results = []
+    for doc_id in reciprocal_rank_fusion([vector_ranking, keyword_ranking], k=config.HYBRID_RRF_K)[:k]:
+        if doc_id in docs_by_id:
+            results.append(docs_by_id[doc_id])
+        else:
+            stored = index.get(doc_id)
+            if stored is not None:
+                results.append(Document(id=doc_id, page_content=stored[0], metadata=stored[1]))
+    return results
@@ -0,0 +1,24 @@
+# tests/test_answer_cache.py
+from src.answer_cache import AnswerCache
+
+
+def make_cache():
+    return AnswerCache(threshold=0.95, ttl_seconds=3600, max_entries=10)
+
+
+def test_reuses_answer_only_for_same_chunks_version_and_history():
+    cache = make_cache()
+    cache.put("docs", [1.0, 0.0], ["a", "b"], 1, "answer", history_key="h")
+    assert cache.lookup("docs", [0.99, 0.01], ["b", "a"], 1, history_key="h") == "answer"
+    assert cache.lookup("docs", [1.0, 0.0], ["a", "b"], 1, history_key="") is None
+    assert cache.lookup("docs", [1.0, 0.0], ["a", "b"], 2, history_key="h") is None
+    assert cache.lookup("docs", [1.0, 0.0], ["a"], 1, history_key="h") is None
+    assert cache.lookup("docs", [0.0, 1.0], ["a", "b"], 1, history_key="h") is None
+
+
+def test_blank_answers_are_not_cached():
+    cache = make_cache()
+    cache.put("docs", [1.0, 0.0], ["a"], 1, "")
+    cache.put("docs", [1.0, 0.0], ["a"], 1, "  \n")
+    assert cache.lookup("docs", [1.0, 0.0], ["a"], 1) is None
+    assert cache.stats()["entries"] == 0
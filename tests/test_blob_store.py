@@ -0,0 +1,25 @@
+# tests/test_blob_store.py
+import os
+import time
+
+from src.blob_store import _blob_path, get_blob, put_blob, sweep_blobs
+
+
+def test_sweep_deletes_only_old_unreferenced_blobs(tmp_path):
+    root = str(tmp_path)
+    keep = put_blob("keep", root)
+    drop = put_blob("drop", root)
+    assert sweep_blobs({keep}, min_age_seconds=0, root=root) == 1
+    assert get_blob(keep, root) == "keep"
+    assert get_blob(drop, root) == ""
+
+
+def test_putting_an_old_blob_again_protects_it_from_the_sweep(tmp_path):
+    root = str(tmp_path)
+    ref = put_blob("table html", root)
+    old = time.time() - 7200
+    os.utime(_blob_path(ref, root), (old, old))
+
+    assert put_blob("table html", root) == ref
+    assert sweep_blobs(set(), min_age_seconds=3600, root=root) == 0
+    assert get_blob(ref, root) == "table html"
@@ -0,0 +1,25 @@
+# tests/test_embedding_cache.py
+import os
+
+import numpy as np
+
+from src.embedding_cache import EmbeddingCache
+
+
+def test_hits_survive_a_restart_and_ignore_whitespace(tmp_path):
+    EmbeddingCache(str(tmp_path)).put_many(["one  chunk", "two"], [[1.0, 0.0], [0.0, 1.0]])
+    cache = EmbeddingCache(str(tmp_path))
+    assert cache.get_many(["one chunk", "two", "three"]) == [[1.0, 0.0], [0.0, 1.0], None]
+
+
+def test_rows_without_a_key_are_cut_off(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    cache.put_many(["one"], [[1.0, 2.0]])
+    # a crash between the two appends leaves a vector row without its key
+    with open(cache.vectors_path, "ab") as f:
+        f.write(np.asarray([[9.0, 9.0]], dtype=np.float32).tobytes())
+
+    cache = EmbeddingCache(str(tmp_path))
+    assert os.path.getsize(cache.vectors_path) == 2 * 4
+    cache.put_many(["two"], [[3.0, 4.0]])
+    assert cache.get_many(["one", "two"]) == [[1.0, 2.0], [3.0, 4.0]]
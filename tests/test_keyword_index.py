@@ -0,0 +1,73 @@
+# tests/test_keyword_index.py
+import math
+import random
+
+from src.keyword_index import KeywordIndex, reciprocal_rank_fusion, tokenize
+
+
+def exhaustive_bm25(index: KeywordIndex, query: str, k: int):
+    """plain bm25 over every posting, what search has to agree with"""
+    n_docs = len(index.doc_lengths)
+    avg_length = index.total_length / n_docs
+    scores = {}
+    for term in set(tokenize(query)):
+        posting = index.postings.get(term, {})
+        idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+        for doc_id, tf in posting.items():
+            norm = index.k1 * (1 - index.b + index.b * index.doc_lengths[doc_id] / avg_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (index.k1 + 1) / (tf + norm)
+    return sorted(scores.values(), reverse=True)[:k]
+
+
+def random_corpus(n_docs: int, seed: int = 0):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(300)]
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    texts = [" ".join(rng.choices(vocab, weights, k=rng.randint(5, 40))) for _ in range(n_docs)]
+    return [f"d{i}" for i in range(n_docs)], texts
+
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("Part A-113 per ISO/IEC") == ["part", "a-113", "a", "113", "per", "iso/iec", "iso", "iec"]
+
+
+def test_exact_identifier_ranks_first():
+    index = KeywordIndex()
+    index.add(
+        ["manual", "spec", "notes"],
+        ["the pump manual", "clause 4.2.1 covers the A-113 valve", "valve notes for the pump"],
+    )
+    assert index.search("A-113 valve", k=3)[0][0] == "spec"
+
+
+def test_search_matches_exhaustive_bm25():
+    index = KeywordIndex()
+    ids, texts = random_corpus(500)
+    index.add(ids, texts)
+    for query in ["w0 w1", "w3 w250", "w42", "w0 w1 w2 w3 w4", "w299 w7"]:
+        got = [score for _, score in index.search(query, k=10)]
+        assert got == exhaustive_bm25(index, query, 10)
+
+
+def test_capped_postings_still_find_the_best_documents():
+    index = KeywordIndex(max_postings_per_term=5)
+    ids, texts = random_corpus(200, seed=1)
+    index.add(ids, texts)
+    index.add(["target"], ["w0 " * 30])
+    assert index.search("w0", k=1)[0][0] == "target"
+
+
+def test_remove_and_readd_update_results():
+    index = KeywordIndex()
+    index.add(["a", "b"], ["alpha beta", "beta gamma"])
+    index.remove(["a"])
+    assert [doc_id for doc_id, _ in index.search("alpha beta")] == ["b"]
+    index.add(["b"], ["alpha only"])
+    assert [doc_id for doc_id, _ in index.search("alpha")] == ["b"]
+    assert index.search("gamma") == []
+
+
+def test_reciprocal_rank_fusion_prefers_ids_ranked_high_everywhere():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "a", "d"], ["b", "c"]])
+    assert fused[:2] == ["b", "a"]
+    assert set(fused) == {"a", "b", "c", "d"}
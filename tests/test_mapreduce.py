@@ -0,0 +1,16 @@
+# tests/test_mapreduce.py
+from src.mapreduce import split_text
+
+
+def test_split_text_respects_size_and_prefers_paragraphs():
+    text = "\n\n".join(f"Paragraph {i}. " + "word " * 40 for i in range(10))
+    chunks = split_text(text, chunk_chars=500)
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    assert all(chunk.startswith("Paragraph") for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_split_text_overlap_and_empty_input():
+    assert split_text("", 100) == []
+    chunks = split_text("abcdefghij" * 10, chunk_chars=30, overlap_chars=10)
+    assert all(later[:10] == earlier[-10:] for earlier, later in zip(chunks, chunks[1:]))
@@ -0,0 +1,33 @@
+# tests/test_quiz_bank.py
+from src.quiz_bank import QuizBank
+
+TYPES = ["multiple_choice", "true_false"]
+
+
+def question(text, q_type="multiple_choice"):
+    return {"question": text, "type": q_type}
+
+
+def test_add_questions_skips_known_ones(tmp_path):
+    bank = QuizBank(str(tmp_path))
+    assert bank.add_questions("doc", "topic", [question("q1"), question("q2")]) == 2
+    assert bank.add_questions("doc", "topic", [question("q2"), question("q3")]) == 1
+    assert bank.unseen_count("doc", "topic") == 3
+    assert bank.question_count("doc", "topic") == 3
+    assert bank.question_count("doc", "other") == 0
+
+
+def test_sample_needs_a_full_quiz_and_prefers_unseen(tmp_path):
+    bank = QuizBank(str(tmp_path))
+    bank.add_questions("doc", "topic", [question("seen"), question("tf", "true_false")], served=1)
+    assert bank.sample("doc", "topic", TYPES + TYPES) is None
+
+    bank.add_questions("doc", "topic", [question("fresh")])
+    quiz = bank.sample("doc", "topic", TYPES)
+    assert [q["question"] for q in quiz["questions"]] == ["fresh", "tf"]
+    assert all("served" not in q for q in quiz["questions"])
+
+
+def test_bank_survives_a_restart(tmp_path):
+    QuizBank(str(tmp_path)).add_questions("doc", "topic", [question("q1")])
+    assert QuizBank(str(tmp_path)).unseen_count("doc", "topic") == 1
@@ -0,0 +1,48 @@
+# tests/test_ratelimit.py
+import threading
+import time
+
+import pytest
+
+from src.ratelimit import TokenBucket, current_priority, request_priority
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_burst_is_capped_by_capacity():
+    bucket = TokenBucket(6000, capacity=2)
+    assert [bucket.acquire(blocking=False) for _ in range(4)] == [True, True, False, False]
+
+
+def test_interactive_goes_before_background_waiting_longer():
+    bucket = TokenBucket(60, capacity=1)  # one token a second
+    assert bucket.acquire()
+    order = []
+
+    def take(priority):
+        bucket.acquire(priority=priority)
+        order.append(priority)
+
+    background = threading.Thread(target=take, args=("background",))
+    background.start()
+    wait_for(lambda: bucket.waiting["background"] == 1)
+    interactive = threading.Thread(target=take, args=("interactive",))
+    interactive.start()
+    background.join()
+    interactive.join()
+    assert order == ["interactive", "background"]
+
+
+def test_request_priority_sets_and_restores():
+    assert current_priority() == "interactive"
+    with request_priority("background"):
+        assert current_priority() == "background"
+    assert current_priority() == "interactive"
+    with pytest.raises(ValueError):
+        with request_priority("urgent"):
+            pass
@@ -0,0 +1,31 @@
+# tests/test_segments.py
+from src.segments import plan_segments, stitch_segments
+
+
+def word(text, start):
+    return {'word': text, 'start': start, 'end': start + 0.2}
+
+
+def record(*words):
+    return {'transcript': ' '.join(w['word'] for w in words), 'words': list(words)}
+
+
+def test_plan_segments_overlap_and_cover_the_audio():
+    assert plan_segments(25, 10, 2) == [(0.0, 12), (10.0, 12), (20.0, 5)]
+    assert plan_segments(0, 10, 2) == []
+
+
+def test_stitch_keeps_each_overlap_word_once():
+    # segments start at 0 and 10 with 2s of overlap, the midpoint is at 11s
+    first = record(word("hello", 1.0), word("there", 10.4), word("friend", 10.9))
+    second = record(word("friend", 1.05), word("again", 1.5))
+    stitched = stitch_segments([(0.0, first), (10.0, second)], overlap_seconds=2)
+    assert stitched['transcript'] == "hello there friend again"
+
+
+def test_stitch_keeps_real_repeats_inside_a_segment():
+    first = record(word("no", 1.0), word("no", 1.3), word("that", 3.0), word("that", 3.2))
+    second = record(word("yes", 2.0), word("yes", 2.2))
+    stitched = stitch_segments([(0.0, first), (10.0, second)], overlap_seconds=2)
+    assert stitched['transcript'] == "no no that that yes yes"
+    assert [w['start'] for w in stitched['words']] == [1.0, 1.3, 3.0, 3.2, 12.0, 12.2]